@@ -66,7 +66,8 @@ CREATE TABLE IF NOT EXISTS contactos (
     INDEX idx_usuario (usuario_id),
     INDEX idx_categoria (categoria_id),
     INDEX idx_telefono (telefono),
-    INDEX idx_foto_perfil (foto_perfil)
+    INDEX idx_foto_perfil (foto_perfil),
+    INDEX idx_usuario_actualizado (usuario_id, fecha_actualizado)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- Tabla de campañas
@@ -56,6 +56,22 @@ async function applyMigrations() {
             }
         }
 
+        // Migración 3: Índice para exportaciones incrementales de contactos
+        console.log('\n📝 Aplicando migración: idx_usuario_actualizado...');
+        try {
+            await connection.execute(`
+                ALTER TABLE contactos 
+                ADD INDEX idx_usuario_actualizado (usuario_id, fecha_actualizado)
+            `);
+            console.log('✅ Índice "idx_usuario_actualizado" agregado');
+        } catch (error) {
+            if (error.code === 'ER_DUP_KEYNAME') {
+                console.log('ℹ️  Índice "idx_usuario_actualizado" ya existe');
+            } else {
+                console.error('❌ Error agregando índice "idx_usuario_actualizado":', error.message);
+            }
+        }
+
         // Verificar estructura final
         console.log('\n🔍 Verificando estructura de tabla "mensajes"...');
         const [columns] = await connection.execute(`
@@ -1,14 +1,32 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
-import pandas as pd
 import os
 import json
+import logging
 from datetime import datetime
-import redis
-import mysql.connector
+from lazy_redis import LazyRedis
+from db_pool import DBPool
+from contact_import import detect_format, read_chunks, read_dataframe, iter_import, ContactImportError
+from contact_upsert import upsert_contacts
+from chat_archive import stream_zip, iter_chat_files, folders_for_phones
+from file_index import FileIndex
+from chat_search import ChatSearchIndex, ChatSearchError
+from chat_compaction import ChatCompactor
+from chat_locks import ChatLockTimeout
+from retention import RetentionManager
+import export_cache
+import export_delta
+import metrics
+from profiling import RequestProfiler
 from dotenv import load_dotenv
-import zipfile
-from io import BytesIO
+from export_writer import write_rows, records_to_rows, EXPORT_FORMATS
+from chat_store import append_chat, materialize_xlsx, export_contact_chat, contact_folder_path, chat_file_path, EXCEL_EXT
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import time
+import unicodedata
+from urllib.parse import quote
+from werkzeug.utils import safe_join
+from export_jobs import enqueue_job, get_job, JOB_QUEUE
 
 # Cargar variables de entorno
 load_dotenv()
@@ -19,26 +37,284 @@ CORS(app)
 # Configuración
 DOWNLOAD_FOLDER = '../../downloads'
 CHATS_FOLDER = '../../chats'
+# Datos internos del microservicio (índices)
+DATA_FOLDER = '../../data'
+# Perfiles de requests (junto a downloads/, fuera de /download)
+PROFILE_FOLDER = '../../profiles'
+# Filas leídas de MySQL por lote en las exportaciones en streaming
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 5000))
+# Pool para escribir los chats de una categoría en paralelo ('thread' o 'process')
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', min(8, os.cpu_count() or 1)))
+EXPORT_POOL_KIND = os.getenv('EXPORT_POOL_KIND', 'thread')
+# Exportar en segundo plano por defecto (cada request puede pedirlo con "async")
+EXPORT_ASYNC = os.getenv('EXPORT_ASYNC', 'false').lower() == 'true'
+
+# Descargas: segundos de caché y envío delegado al proxy (X-Sendfile / X-Accel-Redirect)
+DOWNLOAD_MAX_AGE = int(os.getenv('DOWNLOAD_MAX_AGE', 0))
+DOWNLOAD_ACCEL_PREFIX = os.getenv('DOWNLOAD_ACCEL_PREFIX', '')
+app.config['USE_X_SENDFILE'] = os.getenv('DOWNLOAD_X_SENDFILE', 'false').lower() == 'true'
+# Raíz común de downloads/ y chats/, base de las rutas internas de X-Accel-Redirect
+DATA_ROOT = os.path.abspath(os.path.join(DOWNLOAD_FOLDER, '..'))
 
 # Crear directorios si no existen
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 os.makedirs(CHATS_FOLDER, exist_ok=True)
+os.makedirs(DATA_FOLDER, exist_ok=True)
+
+# Índice de archivos para /stats/files
+file_index = FileIndex(
+    os.getenv('FILE_INDEX_PATH', os.path.join(DATA_FOLDER, 'file_index.sqlite')),
+    DATA_ROOT,
+    {'downloads': DOWNLOAD_FOLDER, 'chats': CHATS_FOLDER}
+)
+
+# Índice de búsqueda de texto completo sobre los chats (/search/chats)
+chat_search = ChatSearchIndex(
+    os.getenv('CHAT_SEARCH_PATH', os.path.join(DATA_FOLDER, 'chat_search.sqlite')),
+    CHATS_FOLDER
+)
 
-# Conexión Redis
-redis_client = redis.Redis(
+# Un archivo borrado por la retención sale del índice de archivos y de la búsqueda
+def forget_file(path):
+    file_index.remove(path)
+    chat_search.remove_file(path)
+
+# Conexión Redis (se abre en el primer comando)
+redis_client = LazyRedis(
     host=os.getenv('REDIS_HOST', 'localhost'),
     port=int(os.getenv('REDIS_PORT', 6379)),
     decode_responses=True
 )
 
-# Conexión MySQL
+# Retención de archivos (barrido en segundo plano desde worker.py)
+retention = RetentionManager(
+    redis_client,
+    DATA_ROOT,
+    DOWNLOAD_FOLDER,
+    CHATS_FOLDER,
+    download_days=int(os.getenv('RETENTION_DOWNLOAD_DAYS', 30)),
+    download_budget_bytes=int(os.getenv('RETENTION_DOWNLOAD_BUDGET_MB', 0)) * 1024 * 1024,
+    chat_days=int(os.getenv('RETENTION_CHAT_DAYS', 0)),
+    batch_size=int(os.getenv('RETENTION_BATCH_SIZE', 500)),
+    max_batches=int(os.getenv('RETENTION_MAX_BATCHES', 20)),
+    reconcile_interval=int(os.getenv('RETENTION_RECONCILE_INTERVAL', 86400)),
+    on_remove=forget_file
+)
+
+logger = logging.getLogger(__name__)
+
+# La retención es un efecto secundario: si Redis no responde la descarga o la
+# exportación sigue igual; el seed/reconcile de la retención recupera lo que falte
+def retention_safe(action, path):
+    import redis
+    try:
+        action(path)
+    except redis.RedisError as e:
+        logger.warning('Retención no disponible (%s %s): %s', action.__name__, path, e)
+
+# Registrar un archivo nuevo de downloads/ en el índice y en la retención
+def register_download(filepath):
+    file_index.record(filepath)
+    retention_safe(retention.track_download, filepath)
+
+# Registrar un archivo diario de chat en el índice, la retención y la búsqueda
+# (un lote solo de duplicados en un día nuevo no llega a crear el log)
+def register_chat_file(filepath):
+    if filepath and os.path.exists(filepath):
+        file_index.record(filepath)
+        retention_safe(retention.track_chat, filepath)
+        chat_search.index_log(filepath)
+
+# Archivos diarios pasados al Parquet mensual: salen de los índices y la
+# retención, y la búsqueda conserva sus mensajes apuntando al Parquet
+def on_chats_compacted(archive, removed):
+    for path in removed:
+        file_index.remove(path)
+        retention.forget_chat(path)
+        chat_search.move_file(path, archive)
+    register_chat_file(archive)
+
+# Archivo movido por la migración a carpetas repartidas (migrate_chats.py); si se
+# fusionó con uno existente, la búsqueda indexa lo agregado al destino
+def on_chat_file_moved(path, new_path, merged):
+    file_index.remove(path)
+    retention.forget_chat(path)
+    if merged:
+        chat_search.remove_file(path)
+    else:
+        chat_search.rename_file(path, new_path)
+    register_chat_file(new_path)
+
+# Compactación de días cerrados en Parquet mensual (periódica desde worker.py)
+compactor = ChatCompactor(
+    redis_client,
+    CHATS_FOLDER,
+    after_days=int(os.getenv('COMPACTION_AFTER_DAYS', 2)),
+    on_compacted=on_chats_compacted
+)
+
+# Pool de conexiones MySQL
+db_pool = DBPool(
+    name='microservice',
+    size=int(os.getenv('DB_POOL_SIZE', 10)),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    host=os.getenv('DB_HOST', 'localhost'),
+    port=int(os.getenv('DB_PORT', 3306)),
+    user=os.getenv('DB_USER', 'root'),
+    password=os.getenv('DB_PASSWORD', ''),
+    database=os.getenv('DB_NAME', 'whatsapp_masivo')
+)
+
+# Conexión MySQL (conn.close() la devuelve al pool)
 def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv('DB_HOST', 'localhost'),
-        user=os.getenv('DB_USER', 'root'),
-        password=os.getenv('DB_PASSWORD', ''),
-        database=os.getenv('DB_NAME', 'whatsapp_masivo')
+    return db_pool.get_connection()
+
+# Leer un cursor sin buffer en lotes de tamaño fijo
+def iter_cursor_batches(cursor, batch_size=EXPORT_BATCH_SIZE, on_batch=None, on_fetch=None):
+    done = 0
+    while True:
+        start = time.perf_counter()
+        rows = cursor.fetchmany(batch_size)
+        if on_fetch:
+            on_fetch(time.perf_counter() - start)
+        if not rows:
+            break
+        for row in rows:
+            yield row
+        done += len(rows)
+        if on_batch:
+            on_batch(done)
+
+# Cerrar el cursor sin buffer y devolver la conexión al pool. Si la escritura
+# falló a mitad quedan filas sin leer y mysql-connector lanza "Unread result
+# found" al cerrar el cursor: se descartan antes, y un error al cerrar no debe
+# ocultar el original ni impedir que la conexión vuelva al pool
+def close_streaming_cursor(conn, cursor):
+    try:
+        try:
+            conn.consume_results()
+        finally:
+            cursor.close()
+    except Exception as e:
+        logger.warning('Error al cerrar el cursor de exportación: %s', e)
+    finally:
+        conn.close()
+
+# Pool de escritura compartido entre requests, creado al primer uso
+_export_pool = None
+
+def get_export_pool():
+    global _export_pool
+    if _export_pool is None:
+        if EXPORT_POOL_KIND == 'process':
+            _export_pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS)
+        else:
+            _export_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+    return _export_pool
+
+# ¿La exportación debe ir a la cola de trabajos en vez de correr en el request?
+def wants_async(data):
+    return bool(data.get('async', EXPORT_ASYNC))
+
+# Encolar una exportación y responder de inmediato con el id del trabajo
+def enqueue_export(job_type, data):
+    job_id = enqueue_job(redis_client, job_type, data)
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/export/jobs/{job_id}'
+    }), 202
+
+# Content-Disposition de descarga. Los nombres de contacto traen acentos y emoji
+# que no caben en latin-1 (gunicorn rechaza la cabecera): se envía el nombre
+# en filename* (RFC 5987) y una versión ASCII en filename para clientes viejos
+def attachment_disposition(filename):
+    fallback = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+    fallback = ''.join(c for c in fallback if c.isprintable() and c not in '"\\') or 'descarga'
+    if fallback == filename:
+        return f'attachment; filename="{filename}"'
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+# Enviar un archivo con soporte de Range, ETag e If-Modified-Since.
+# send_file responde 206/304 según los headers del request y usa
+# wsgi.file_wrapper (sendfile en gunicorn) para copiar sin pasar por Python.
+# Detrás de nginx, DOWNLOAD_ACCEL_PREFIX delega el envío con X-Accel-Redirect.
+def send_download(filepath):
+    filepath = os.path.abspath(filepath)
+
+    if DOWNLOAD_ACCEL_PREFIX:
+        relative = os.path.relpath(filepath, DATA_ROOT).replace(os.sep, '/')
+        response = Response(status=200)
+        response.headers['X-Accel-Redirect'] = f"{DOWNLOAD_ACCEL_PREFIX.rstrip('/')}/{relative}"
+        response.headers['Content-Disposition'] = attachment_disposition(os.path.basename(filepath))
+        return response
+
+    response = send_file(
+        filepath,
+        as_attachment=True,
+        conditional=True,
+        etag=True,
+        max_age=DOWNLOAD_MAX_AGE
     )
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+# Métricas Prometheus: latencia por ruta y estado del pool y de la cola
+metrics.init_app(app, db_pool=db_pool, queue_length=lambda: redis_client.llen(JOB_QUEUE))
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+# Perfilado bajo demanda: header X-Profile con PROFILE_TOKEN
+profiler = RequestProfiler(
+    PROFILE_FOLDER,
+    os.getenv('PROFILE_TOKEN', ''),
+    keep=int(os.getenv('PROFILE_KEEP', 50))
+)
+profiler.init_app(app)
+
+# Resumen de un perfil: funciones más costosas y asignaciones (solo admins)
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    if not profiler.authorized():
+        return jsonify({
+            'error': True,
+            'message': 'Acceso denegado'
+        }), 403
+
+    summary = profiler.get(profile_id)
+    if not summary:
+        return jsonify({
+            'error': True,
+            'message': 'Perfil no encontrado'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'profile': summary,
+        'pstats_url': f'/profiles/{profile_id}/pstats'
+    }), 200
+
+# Descargar el perfil en formato pstats (snakeviz, python -m pstats)
+@app.route('/profiles/<profile_id>/pstats', methods=['GET'])
+def download_profile(profile_id):
+    if not profiler.authorized():
+        return jsonify({
+            'error': True,
+            'message': 'Acceso denegado'
+        }), 403
+
+    prof_path = profiler.stats_path(profile_id)
+    if not prof_path:
+        return jsonify({
+            'error': True,
+            'message': 'Perfil no encontrado'
+        }), 404
+
+    return send_file(os.path.abspath(prof_path), as_attachment=True)
 
 # Health check
 @app.route('/health', methods=['GET'])
@@ -46,50 +322,184 @@ def health():
     return jsonify({'status': 'OK', 'service': 'Python Microservice'}), 200
 
 # Exportar contactos a Excel
-@app.route('/export/contacts', methods=['POST'])
-def export_contacts():
-    try:
-        data = request.json
-        categoria_id = data.get('categoria_id')
-        usuario_id = data.get('usuario_id')
+@metrics.track_export('contacts')
+def run_export_contacts(data, progress=None):
+    categoria_id = data.get('categoria_id')
+    usuario_id = data.get('usuario_id')
+    stream = data.get('stream', False)
+    fmt = data.get('format', 'xlsx')
+    use_cache = data.get('cache', True)
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+    # Exportación incremental: desde un watermark explícito o el guardado del consumidor
+    since = data.get('since')
+    consumer = data.get('consumer')
+    delta = bool(since or consumer)
 
-        query = '''
-            SELECT c.id, c.nombre, c.telefono, c.estado, 
-                   cat.nombre as categoria, c.fecha_agregado
-            FROM contactos c
-            LEFT JOIN categorias cat ON c.categoria_id = cat.id
-            WHERE c.usuario_id = %s
-        '''
-        params = [usuario_id]
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Formato no soportado: {fmt}')
 
-        if categoria_id:
-            query += ' AND c.categoria_id = %s'
-            params.append(categoria_id)
+    if delta:
+        use_cache = False
+        if not since:
+            since = export_delta.get_watermark(redis_client, consumer, usuario_id, categoria_id)
 
-        cursor.execute(query, params)
-        contacts = cursor.fetchall()
+    conn = get_db_connection()
+    key = export_cache.cache_key(usuario_id, categoria_id, fmt)
 
-        cursor.close()
-        conn.close()
+    # Si los datos no cambiaron desde la última exportación igual, reutilizarla.
+    # La caché es opcional: sin Redis se exporta igual (y no se guarda)
+    if use_cache:
+        import redis
+        cached = None
+        try:
+            with metrics.phase('contacts', 'cache_check'):
+                version = export_cache.contacts_version(conn, usuario_id, categoria_id)
+                cached = export_cache.get_cached(redis_client, key, version)
+        except redis.RedisError as e:
+            logger.warning('Caché de exportaciones no disponible: %s', e)
+            use_cache = False
+        except Exception:
+            conn.close()
+            raise
 
-        # Crear DataFrame
-        df = pd.DataFrame(contacts)
-        
-        # Generar archivo Excel
-        filename = f'contactos_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        filepath = os.path.join(DOWNLOAD_FOLDER, filename)
-        
-        df.to_excel(filepath, index=False, engine='openpyxl')
+        if cached and os.path.exists(os.path.join(DOWNLOAD_FOLDER, cached['filename'])):
+            conn.close()
+            if progress:
+                progress(cached['total'], cached['total'])
+            return {
+                'success': True,
+                'filename': cached['filename'],
+                'filepath': os.path.join(DOWNLOAD_FOLDER, cached['filename']),
+                'total': cached['total'],
+                'format': fmt,
+                'stream': bool(stream),
+                'cached': True,
+                # Misma forma que una exportación nueva (las incrementales no usan caché)
+                'delta': False,
+                'since': None,
+                'watermark': None
+            }
 
-        return jsonify({
-            'success': True,
-            'filename': filename,
-            'filepath': filepath,
-            'total': len(contacts)
-        }), 200
+    query = '''
+        SELECT c.id, c.nombre, c.telefono, c.estado, 
+               cat.nombre as categoria, c.fecha_agregado
+        FROM contactos c
+        LEFT JOIN categorias cat ON c.categoria_id = cat.id
+        WHERE c.usuario_id = %s
+    '''
+    params = [usuario_id]
+
+    if categoria_id:
+        query += ' AND c.categoria_id = %s'
+        params.append(categoria_id)
+
+    watermark = None
+    if delta:
+        try:
+            watermark = export_delta.db_now(conn)
+        except Exception:
+            conn.close()
+            raise
+        query = query.replace('c.fecha_agregado', 'c.fecha_agregado, c.fecha_actualizado', 1)
+        query += ' AND c.fecha_actualizado < %s'
+        params.append(watermark)
+        if since:
+            query += ' AND c.fecha_actualizado >= %s'
+            params.append(since)
+
+    # Generar archivo (xlsx, csv o parquet)
+    prefix = 'contactos_delta' if delta else 'contactos'
+    filename = export_cache.export_filename(prefix, key, fmt)
+    filepath = os.path.join(DOWNLOAD_FOLDER, filename)
+
+    if stream:
+        # Modo streaming: cursor sin buffer leído por lotes, memoria constante
+        cursor = conn.cursor(buffered=False)
+        fetch_seconds = []
+        try:
+            with metrics.phase('contacts', 'sql'):
+                cursor.execute(query, params)
+            columns = [col[0] for col in cursor.description]
+
+            # Lectura y escritura se intercalan: la fase write descuenta el tiempo en fetchmany
+            start = time.perf_counter()
+            total = write_rows(fmt, filepath, columns, iter_cursor_batches(
+                cursor, on_batch=progress, on_fetch=fetch_seconds.append
+            ))
+            metrics.observe_phase('contacts', 'sql_fetch', sum(fetch_seconds))
+            metrics.observe_phase('contacts', 'write', time.perf_counter() - start - sum(fetch_seconds))
+        finally:
+            close_streaming_cursor(conn, cursor)
+    else:
+        try:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                with metrics.phase('contacts', 'sql'):
+                    cursor.execute(query, params)
+                with metrics.phase('contacts', 'sql_fetch'):
+                    contacts = cursor.fetchall()
+                columns = [col[0] for col in cursor.description] if cursor.description else []
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+        if progress:
+            progress(0, len(contacts))
+        with metrics.phase('contacts', 'write'):
+            total = write_rows(fmt, filepath, columns, records_to_rows(contacts, columns))
+
+    metrics.count_written('contacts', total, os.path.getsize(filepath))
+
+    with metrics.phase('contacts', 'file_io'):
+        register_download(filepath)
+
+    # Guardar en caché y eliminar la variante que queda obsoleta
+    if use_cache:
+        import redis
+        try:
+            previous = export_cache.store(redis_client, key, version, filename, total)
+        except redis.RedisError as e:
+            logger.warning('Caché de exportaciones no disponible: %s', e)
+            previous = None
+        if previous and previous['filename'] != filename:
+            retention_safe(retention.remove_download, os.path.join(DOWNLOAD_FOLDER, previous['filename']))
+
+    # El consumidor avanza su cursor solo cuando el archivo quedó escrito
+    if delta and consumer:
+        export_delta.set_watermark(redis_client, consumer, usuario_id, categoria_id, watermark)
+
+    if progress:
+        progress(total, total)
+
+    return {
+        'success': True,
+        'filename': filename,
+        'filepath': filepath,
+        'total': total,
+        'format': fmt,
+        'stream': bool(stream),
+        'cached': False,
+        'delta': delta,
+        'since': since,
+        'watermark': watermark
+    }
+
+@app.route('/export/contacts', methods=['POST'])
+def export_contacts():
+    try:
+        data = request.json
+
+        if data.get('format', 'xlsx') not in EXPORT_FORMATS:
+            return jsonify({
+                'error': True,
+                'message': f"Formato no soportado: {data.get('format')}"
+            }), 400
+
+        if wants_async(data):
+            return enqueue_export('contacts', data)
+
+        return jsonify(run_export_contacts(data)), 200
 
     except Exception as e:
         return jsonify({
@@ -98,48 +508,55 @@ def export_contacts():
         }), 500
 
 # Exportar chat individual
+@metrics.track_export('chat')
+def run_export_chat(data, progress=None):
+    chat_data = data.get('messages', [])
+    contact_name = data.get('contact_name', 'chat')
+    contact_phone = data.get('contact_phone', 'unknown')
+
+    # Agregar al log del día del contacto (el Excel se genera al descargar)
+    with metrics.phase('chat', 'write'):
+        saved = append_chat(CHATS_FOLDER, contact_name, contact_phone, chat_data)
+    metrics.count_written('chat', saved['messages_saved'], saved['bytes'])
+
+    with metrics.phase('chat', 'file_io'):
+        register_chat_file(saved['log_path'])
+
+    if progress:
+        progress(len(chat_data), len(chat_data))
+
+    return {
+        'success': True,
+        'filename': saved['filename'],
+        'filepath': saved['log_path'],
+        'folder': saved['folder'],
+        'download': f"/download/chat/{saved['folder_name']}/{saved['filename']}",
+        'messages_saved': saved['messages_saved'],
+        'duplicates': saved['duplicates']
+    }
+
 @app.route('/export/chat', methods=['POST'])
 def export_chat():
     try:
         data = request.json
-        chat_data = data.get('messages', [])
-        contact_name = data.get('contact_name', 'chat')
-        contact_phone = data.get('contact_phone', 'unknown')
 
-        if not chat_data:
+        if not data.get('messages', []):
             return jsonify({
                 'error': True,
                 'message': 'No hay mensajes para exportar'
             }), 400
 
-        # Crear carpeta para el contacto
-        contact_folder_name = f"{contact_name.replace(' ', '_')}_{contact_phone}"
-        contact_folder_path = os.path.join(CHATS_FOLDER, contact_folder_name)
-        os.makedirs(contact_folder_path, exist_ok=True)
-
-        # Generar archivo Excel para hoy
-        today = datetime.now().strftime("%d-%m-%Y")
-        filename = f"{contact_name.replace(' ', '_')}_{contact_phone}_{today}.xlsx"
-        filepath = os.path.join(contact_folder_path, filename)
-
-        # Si el archivo existe, cargar y agregar
-        if os.path.exists(filepath):
-            existing_df = pd.read_excel(filepath)
-            new_df = pd.DataFrame(chat_data)
-            df = pd.concat([existing_df, new_df], ignore_index=True)
-        else:
-            df = pd.DataFrame(chat_data)
+        if wants_async(data):
+            return enqueue_export('chat', data)
 
-        # Guardar Excel
-        df.to_excel(filepath, index=False, engine='openpyxl')
+        return jsonify(run_export_chat(data)), 200
 
+    except ChatLockTimeout as e:
+        # Otro worker o nodo escribe este chat: reintentar es seguro (deduplicación)
         return jsonify({
-            'success': True,
-            'filename': filename,
-            'filepath': filepath,
-            'folder': contact_folder_path,
-            'messages_saved': len(chat_data)
-        }), 200
+            'error': True,
+            'message': str(e)
+        }), 503
 
     except Exception as e:
         return jsonify({
@@ -148,55 +565,101 @@ def export_chat():
         }), 500
 
 # Exportar todos los chats de una categoría
+@metrics.track_export('category-chats')
+def run_export_category_chats(data, progress=None):
+    chats_data = data.get('chats', [])
+    start = time.perf_counter()
+
+    # Agrupar por contacto: cada archivo lo escribe una sola tarea del pool
+    contacts = {}
+    for chat in chats_data:
+        contact_name = chat.get('contact_name', 'unknown')
+        contact_phone = chat.get('contact_phone', 'unknown')
+        messages = chat.get('messages', [])
+
+        if not messages:
+            continue
+
+        contacts.setdefault((contact_name, contact_phone), []).extend(messages)
+
+    pool = get_export_pool()
+    futures = [
+        pool.submit(export_contact_chat, CHATS_FOLDER, contact_name, contact_phone, messages)
+        for (contact_name, contact_phone), messages in contacts.items()
+    ]
+
+    results = []
+    for future in futures:
+        result = future.result()
+        metrics.observe_phase('category-chats', 'write', result['elapsed_ms'] / 1000)
+        if result['success']:
+            metrics.count_written('category-chats', result['messages_saved'], result['bytes'])
+            with metrics.phase('category-chats', 'file_io'):
+                register_chat_file(result['log_path'])
+        results.append(result)
+        if progress:
+            progress(len(results), len(futures))
+
+    exported_files = [r['filename'] for r in results if r['success']]
+    errors = [r for r in results if not r['success']]
+
+    return {
+        'success': not errors,
+        'total_chats': len(exported_files),
+        'files': exported_files,
+        'results': results,
+        'errors': errors,
+        'timings': {
+            'total_ms': round((time.perf_counter() - start) * 1000, 2),
+            'workers': EXPORT_WORKERS,
+            'pool': EXPORT_POOL_KIND
+        }
+    }
+
 @app.route('/export/category-chats', methods=['POST'])
 def export_category_chats():
     try:
         data = request.json
-        categoria_id = data.get('categoria_id')
-        usuario_id = data.get('usuario_id')
-        chats_data = data.get('chats', [])
 
-        if not chats_data:
+        if not data.get('chats', []):
             return jsonify({
                 'error': True,
                 'message': 'No hay chats para exportar'
             }), 400
 
-        exported_files = []
-
-        for chat in chats_data:
-            contact_name = chat.get('contact_name', 'unknown')
-            contact_phone = chat.get('contact_phone', 'unknown')
-            messages = chat.get('messages', [])
+        if wants_async(data):
+            return enqueue_export('category-chats', data)
 
-            if not messages:
-                continue
+        return jsonify(run_export_category_chats(data)), 200
 
-            # Crear carpeta para el contacto
-            contact_folder_name = f"{contact_name.replace(' ', '_')}_{contact_phone}"
-            contact_folder_path = os.path.join(CHATS_FOLDER, contact_folder_name)
-            os.makedirs(contact_folder_path, exist_ok=True)
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
 
-            # Generar archivo Excel
-            today = datetime.now().strftime("%d-%m-%Y")
-            filename = f"{contact_name.replace(' ', '_')}_{contact_phone}_{today}.xlsx"
-            filepath = os.path.join(contact_folder_path, filename)
+# Handlers que ejecuta worker.py para cada tipo de trabajo
+EXPORT_HANDLERS = {
+    'contacts': run_export_contacts,
+    'chat': run_export_chat,
+    'category-chats': run_export_category_chats
+}
 
-            # Si existe, agregar
-            if os.path.exists(filepath):
-                existing_df = pd.read_excel(filepath)
-                new_df = pd.DataFrame(messages)
-                df = pd.concat([existing_df, new_df], ignore_index=True)
-            else:
-                df = pd.DataFrame(messages)
+# Estado y progreso de un trabajo de exportación
+@app.route('/export/jobs/<job_id>', methods=['GET'])
+def export_job_status(job_id):
+    try:
+        job = get_job(redis_client, job_id)
 
-            df.to_excel(filepath, index=False, engine='openpyxl')
-            exported_files.append(filename)
+        if not job:
+            return jsonify({
+                'error': True,
+                'message': 'Trabajo no encontrado'
+            }), 404
 
         return jsonify({
             'success': True,
-            'total_chats': len(exported_files),
-            'files': exported_files
+            'job': job
         }), 200
 
     except Exception as e:
@@ -205,19 +668,153 @@ def export_category_chats():
             'message': str(e)
         }), 500
 
+# Descargar el archivo resultante de un trabajo terminado
+@app.route('/export/jobs/<job_id>/file', methods=['GET'])
+def export_job_file(job_id):
+    try:
+        job = get_job(redis_client, job_id)
+
+        if not job:
+            return jsonify({
+                'error': True,
+                'message': 'Trabajo no encontrado'
+            }), 404
+
+        if job['status'] != 'done':
+            return jsonify({
+                'error': True,
+                'message': f"El trabajo está en estado '{job['status']}'",
+                'status': job['status']
+            }), 409
+
+        result = job['result']
+        if job['type'] == 'contacts':
+            filepath = os.path.join(DOWNLOAD_FOLDER, result['filename'])
+            retention_safe(retention.touch_download, filepath)
+        elif job['type'] == 'chat':
+            filepath = materialize_xlsx(os.path.join(result['folder'], result['filename']))
+            register_chat_file(filepath)
+        else:
+            return jsonify({
+                'error': True,
+                'message': 'Este trabajo genera varios archivos',
+                'files': result.get('files', [])
+            }), 400
+
+        if not filepath or not os.path.exists(filepath):
+            return jsonify({
+                'error': True,
+                'message': 'Archivo no encontrado'
+            }), 404
+
+        return send_download(filepath)
+
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
 # Descargar archivo
 @app.route('/download/<path:filename>', methods=['GET'])
 def download_file(filename):
     try:
-        filepath = os.path.join(DOWNLOAD_FOLDER, filename)
+        filepath = safe_join(DOWNLOAD_FOLDER, filename)
         
-        if not os.path.exists(filepath):
+        if not filepath or not os.path.isfile(filepath):
+            return jsonify({
+                'error': True,
+                'message': 'Archivo no encontrado'
+            }), 404
+
+        retention_safe(retention.touch_download, filepath)
+        return send_download(filepath)
+
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
+# Descargar el Excel diario de un chat (se genera desde el log si cambió)
+@app.route('/download/chat/<path:filename>', methods=['GET'])
+def download_chat(filename):
+    try:
+        # Solo los Excel diarios: logs, Parquet, dedup.idx y manifest.json son internos
+        if not filename.endswith(EXCEL_EXT):
             return jsonify({
                 'error': True,
                 'message': 'Archivo no encontrado'
             }), 404
 
-        return send_file(filepath, as_attachment=True)
+        # La URL usa {carpeta}/{archivo}; en disco la carpeta puede estar repartida
+        filepath = chat_file_path(CHATS_FOLDER, filename) if safe_join(CHATS_FOLDER, filename) else None
+        xlsx_path = materialize_xlsx(filepath) if filepath else None
+        register_chat_file(xlsx_path)
+
+        if not xlsx_path:
+            return jsonify({
+                'error': True,
+                'message': 'Archivo no encontrado'
+            }), 404
+
+        return send_download(xlsx_path)
+
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
+# Descargar en un ZIP (generado en streaming) los chats de un contacto o de una categoría
+@app.route('/download/chats-zip', methods=['GET'])
+def download_chats_zip():
+    try:
+        contact = request.args.get('contact')
+        contact_phone = request.args.get('contact_phone')
+        categoria_id = request.args.get('categoria_id')
+
+        # Rango de fechas opcional (YYYY-MM-DD, inclusivo)
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None
+        date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
+
+        if contact:
+            folder_names = [contact]
+            zip_name = contact
+        elif contact_phone:
+            folder_names = folders_for_phones(CHATS_FOLDER, [contact_phone])
+            zip_name = contact_phone
+        elif categoria_id:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT telefono FROM contactos WHERE categoria_id = %s', [categoria_id])
+                phones = [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+                conn.close()
+            folder_names = folders_for_phones(CHATS_FOLDER, phones)
+            zip_name = f'categoria_{categoria_id}'
+        else:
+            return jsonify({
+                'error': True,
+                'message': 'Indique contact, contact_phone o categoria_id'
+            }), 400
+
+        # Evitar salir de CHATS_FOLDER con nombres como "../x"
+        folder_names = [name for name in folder_names if safe_join(CHATS_FOLDER, name)]
+        if not any(os.path.isdir(contact_folder_path(CHATS_FOLDER, name)) for name in folder_names):
+            return jsonify({
+                'error': True,
+                'message': 'No se encontraron chats'
+            }), 404
+
+        files = iter_chat_files(CHATS_FOLDER, folder_names, date_from, date_to, on_file=register_chat_file)
+        response = Response(stream_with_context(stream_zip(files)), mimetype='application/zip')
+        response.headers['Content-Disposition'] = attachment_disposition(f'chats_{zip_name}.zip')
+        return response
 
     except Exception as e:
         return jsonify({
@@ -229,19 +826,21 @@ def download_file(filename):
 @app.route('/stats/files', methods=['GET'])
 def file_stats():
     try:
-        # Contar archivos en downloads
-        downloads_count = len([f for f in os.listdir(DOWNLOAD_FOLDER) if os.path.isfile(os.path.join(DOWNLOAD_FOLDER, f))])
-        
-        # Contar carpetas de chats
-        chats_count = len([d for d in os.listdir(CHATS_FOLDER) if os.path.isdir(os.path.join(CHATS_FOLDER, d))])
+        # Primer uso: poblar el índice con un recorrido completo
+        if file_index.last_reconcile() is None:
+            file_index.reconcile()
+
+        index_stats = file_index.stats()
 
         return jsonify({
             'success': True,
             'stats': {
-                'downloads': downloads_count,
-                'chat_folders': chats_count,
+                'downloads': index_stats['downloads']['files'],
+                'chat_folders': index_stats['chats']['folders'],
                 'download_path': DOWNLOAD_FOLDER,
-                'chats_path': CHATS_FOLDER
+                'chats_path': CHATS_FOLDER,
+                'detail': index_stats,
+                'last_reconcile': file_index.last_reconcile()
             }
         }), 200
 
@@ -251,30 +850,166 @@ def file_stats():
             'message': str(e)
         }), 500
 
-# Limpiar archivos antiguos (opcional)
+# Sincronizar el índice de archivos con el disco
+@app.route('/stats/files/reconcile', methods=['POST'])
+def reconcile_file_index():
+    try:
+        return jsonify({
+            'success': True,
+            'reconcile': file_index.reconcile()
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
+# Buscar en los chats: q (palabras, * como prefijo), filtros por contacto,
+# teléfono, categoría y fechas (YYYY-MM-DD, inclusivo) y paginado
+@app.route('/search/chats', methods=['GET'])
+def search_chats():
+    try:
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None
+        date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
+
+        phones = None
+        categoria_id = request.args.get('categoria_id')
+        if categoria_id:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT telefono FROM contactos WHERE categoria_id = %s', [categoria_id])
+                phones = [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+                conn.close()
+
+        results = chat_search.search(
+            request.args.get('q', ''),
+            contact=request.args.get('contact'),
+            phone=request.args.get('contact_phone'),
+            phones=phones,
+            date_from=date_from,
+            date_to=date_to,
+            page=int(request.args.get('page', 1)),
+            page_size=int(request.args.get('page_size', 50))
+        )
+
+        return jsonify({
+            'success': True,
+            **results
+        }), 200
+
+    except (ChatSearchError, ValueError) as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
+# Indexar lo pendiente: logs, meses compactados y Excel del formato anterior
+@app.route('/search/chats/reindex', methods=['POST'])
+def reindex_chats():
+    try:
+        return jsonify({
+            'success': True,
+            'reindex': chat_search.reindex()
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
+# Métricas del pool de conexiones MySQL
+@app.route('/stats/db-pool', methods=['GET'])
+def db_pool_stats():
+    try:
+        return jsonify({
+            'success': True,
+            'pool': db_pool.stats()
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
+# Limpiar archivos antiguos: barrido de retención inmediato sobre los índices
+# (el recorrido del disco para reconciliarlos corre solo en worker.py)
 @app.route('/cleanup', methods=['POST'])
 def cleanup_old_files():
     try:
-        data = request.json
+        data = request.json or {}
         days = data.get('days', 30)
 
-        import time
-        now = time.time()
-        cutoff = now - (days * 86400)
+        report = retention.sweep(download_days=days)
+
+        return jsonify({
+            'success': True,
+            'deleted_files': report['downloads']['expired_files'] + report['downloads']['evicted_files'],
+            'reclaimed_bytes': report['reclaimed_bytes'],
+            'report': report
+        }), 200
 
-        deleted_count = 0
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
+# Resultado del último barrido de retención
+@app.route('/retention/status', methods=['GET'])
+def retention_status():
+    try:
+        return jsonify({
+            'success': True,
+            'last_sweep': retention.last_sweep()
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
+# Compactar ya los días cerrados (además de la compactación periódica del worker)
+@app.route('/chats/compact', methods=['POST'])
+def compact_chats():
+    try:
+        data = request.json or {}
+        after_days = data.get('after_days')
 
-        # Limpiar downloads
-        for filename in os.listdir(DOWNLOAD_FOLDER):
-            filepath = os.path.join(DOWNLOAD_FOLDER, filename)
-            if os.path.isfile(filepath):
-                if os.path.getctime(filepath) < cutoff:
-                    os.remove(filepath)
-                    deleted_count += 1
+        report = compactor.compact(after_days=int(after_days) if after_days is not None else None)
 
         return jsonify({
             'success': True,
-            'deleted_files': deleted_count
+            'report': report
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
+# Resultado de la última compactación
+@app.route('/chats/compact/status', methods=['GET'])
+def compaction_status():
+    try:
+        return jsonify({
+            'success': True,
+            'last_run': compactor.last_run()
         }), 200
 
     except Exception as e:
@@ -294,9 +1029,49 @@ def import_contacts():
             }), 400
 
         file = request.files['file']
-        
-        # Leer Excel
-        df = pd.read_excel(file, engine='openpyxl')
+        mode = request.args.get('mode') or request.form.get('mode')
+        fmt = detect_format(file, request.args.get('format') or request.form.get('format'))
+
+        # Modo por bloques: respuesta NDJSON en streaming o paginada
+        if mode in ('ndjson', 'paged'):
+            chunks = read_chunks(file, fmt)
+
+            if mode == 'ndjson':
+                return Response(
+                    stream_with_context(iter_import_ndjson(chunks)),
+                    mimetype='application/x-ndjson'
+                )
+
+            page = int(request.args.get('page', 1))
+            page_size = int(request.args.get('page_size', 1000))
+            return jsonify(import_page(chunks, page, page_size)), 200
+
+        # Modo upsert: escribir los contactos directamente en MySQL
+        if mode == 'upsert':
+            usuario_id = request.args.get('usuario_id') or request.form.get('usuario_id')
+            categoria_id = request.args.get('categoria_id') or request.form.get('categoria_id')
+
+            if not usuario_id:
+                return jsonify({
+                    'error': True,
+                    'message': 'usuario_id es requerido'
+                }), 400
+
+            chunks = read_chunks(file, fmt)
+            conn = get_db_connection()
+            try:
+                counts = upsert_contacts(conn, int(usuario_id), iter_import(chunks),
+                                         categoria_id=int(categoria_id) if categoria_id else None)
+            finally:
+                conn.close()
+
+            return jsonify({
+                'success': True,
+                **counts
+            }), 200
+
+        # Leer archivo completo
+        df = read_dataframe(file, fmt)
         
         # Validar columnas requeridas
         required_cols = ['telefono']
@@ -316,15 +1091,79 @@ def import_contacts():
             'total': len(contacts)
         }), 200
 
+    except ContactImportError as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 400
+
     except Exception as e:
         return jsonify({
             'error': True,
             'message': str(e)
         }), 500
 
+# Una línea JSON por bloque procesado y una línea final con los totales.
+# El estado 200 ya se envió: un error a mitad del archivo termina la respuesta
+# con una línea {"error": true, ...} en lugar de la de totales
+def iter_import_ndjson(chunks):
+    totals = {'rows': 0, 'contacts': 0, 'invalid': 0, 'duplicates': 0}
+    try:
+        for result in iter_import(chunks):
+            totals['rows'] += result['rows']
+            totals['contacts'] += len(result['contacts'])
+            totals['invalid'] += result['invalid']
+            totals['duplicates'] += result['duplicates']
+            yield json.dumps(result, ensure_ascii=False, default=str) + '\n'
+    except Exception as e:
+        yield json.dumps({'error': True, 'message': str(e), **totals}, ensure_ascii=False) + '\n'
+        return
+    yield json.dumps({'done': True, **totals}) + '\n'
+
+# Una página de contactos válidos y únicos (se deja de leer al completarla)
+def import_page(chunks, page, page_size):
+    offset = (max(page, 1) - 1) * page_size
+    contacts = []
+    seen_valid = 0
+    has_more = False
+
+    for result in iter_import(chunks):
+        for contact in result['contacts']:
+            if seen_valid >= offset + page_size:
+                has_more = True
+                break
+            if seen_valid >= offset:
+                contacts.append(contact)
+            seen_valid += 1
+        if has_more:
+            break
+
+    return {
+        'success': True,
+        'contacts': contacts,
+        'total': len(contacts),
+        'page': page,
+        'page_size': page_size,
+        'has_more': has_more
+    }
+
+# Precarga para workers calientes: importa de una vez las dependencias que las
+# rutas cargan al primer uso (pandas, openpyxl, pyarrow, redis, mysql.connector)
+def preload():
+    import pandas
+    import openpyxl
+    import pyarrow.csv
+    import pyarrow.parquet
+    import mysql.connector.pooling
+    redis_client.get_client()
+
+if os.getenv('PRELOAD_DEPENDENCIES', 'false').lower() == 'true':
+    preload()
+
+# Servidor de desarrollo (recarga y debugger). En producción: python serve.py
 if __name__ == '__main__':
-    print('🐍 Microservicio Python iniciado')
+    print('🐍 Microservicio Python iniciado (modo desarrollo)')
     print('📂 Carpeta de descargas:', DOWNLOAD_FOLDER)
     print('💬 Carpeta de chats:', CHATS_FOLDER)
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG', 'true').lower() == 'true', threaded=True)
 
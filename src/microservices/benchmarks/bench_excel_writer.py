@@ -0,0 +1,72 @@
+# Benchmark: escritor write-only (export_writer) vs DataFrame.to_excel
+#
+# Uso (desde src/microservices):
+#   python -m benchmarks.bench_excel_writer --rows 10000 100000
+#
+# Cada variante corre en un proceso nuevo para que el pico de RSS sea propio.
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generators import CONTACT_COLUMNS as COLUMNS, iter_contacts
+
+
+# Pico de RSS del proceso actual en MB (ru_maxrss está en KB en Linux)
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_pandas(n, filepath):
+    import pandas as pd
+    base_rss = peak_rss_mb()
+    start = time.perf_counter()
+    # Camino actual: fetchall() -> DataFrame -> to_excel
+    contacts = list(iter_contacts(n))
+    pd.DataFrame(contacts).to_excel(filepath, index=False, engine='openpyxl')
+    return time.perf_counter() - start, base_rss, peak_rss_mb()
+
+
+def run_writer(n, filepath):
+    from export_writer import write_xlsx, records_to_rows
+    base_rss = peak_rss_mb()
+    start = time.perf_counter()
+    write_xlsx(filepath, COLUMNS, records_to_rows(iter_contacts(n), COLUMNS))
+    return time.perf_counter() - start, base_rss, peak_rss_mb()
+
+
+VARIANTS = {'pandas_to_excel': run_pandas, 'write_only': run_writer}
+
+
+def _child(name, n, queue):
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, 'bench.xlsx')
+        elapsed, base_rss, peak = VARIANTS[name](n, filepath)
+        queue.put((elapsed, base_rss, peak, os.path.getsize(filepath)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del escritor de Excel')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    ctx = get_context('spawn')
+    print(f"{'variante':<18}{'filas':>10}{'seg':>9}{'filas/s':>12}{'RSS pico MB':>14}{'Δ RSS MB':>11}")
+    for n in args.rows:
+        for name in VARIANTS:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_child, args=(name, n, queue))
+            proc.start()
+            elapsed, base_rss, peak, _size = queue.get()
+            proc.join()
+            print(f'{name:<18}{n:>10}{elapsed:>9.2f}{n / elapsed:>12.0f}{peak:>14.1f}{peak - base_rss:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
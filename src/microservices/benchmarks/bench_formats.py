@@ -0,0 +1,69 @@
+# Benchmark: exportación e importación de contactos en xlsx, csv y parquet
+#
+# Uso (desde src/microservices):
+#   python -m benchmarks.bench_formats --rows 10000 100000 1000000
+#
+# Cada combinación (formato, filas) corre en un proceso nuevo: se escribe el
+# archivo con export_writer y se vuelve a leer con el pipeline de importación.
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generators import CONTACT_COLUMNS, iter_contacts
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child(fmt, n, queue):
+    from export_writer import write_rows, records_to_rows
+    from contact_import import read_chunks, iter_import
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, f'contactos.{fmt}')
+
+        start = time.perf_counter()
+        write_rows(fmt, filepath, CONTACT_COLUMNS, records_to_rows(iter_contacts(n), CONTACT_COLUMNS))
+        write_s = time.perf_counter() - start
+        size_mb = os.path.getsize(filepath) / (1024 * 1024)
+
+        start = time.perf_counter()
+        with open(filepath, 'rb') as f:
+            imported = sum(len(r['contacts']) for r in iter_import(read_chunks(f, fmt)))
+        read_s = time.perf_counter() - start
+
+        queue.put((write_s, read_s, size_mb, imported, peak_rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de formatos de contactos')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=FORMATS)
+    args = parser.parse_args()
+
+    ctx = get_context('spawn')
+    print(f"{'formato':<9}{'filas':>10}{'export s':>10}{'export f/s':>12}"
+          f"{'import s':>10}{'import f/s':>12}{'MB':>8}{'RSS pico MB':>13}")
+    for n in args.rows:
+        for fmt in args.formats:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_child, args=(fmt, n, queue))
+            proc.start()
+            write_s, read_s, size_mb, _imported, peak = queue.get()
+            proc.join()
+            print(f'{fmt:<9}{n:>10}{write_s:>10.2f}{n / write_s:>12.0f}'
+                  f'{read_s:>10.2f}{n / read_s:>12.0f}{size_mb:>8.1f}{peak:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+# Benchmark: throughput de las rutas de exportación e importación
+#
+# Uso (desde src/microservices, requiere fakeredis: pip install -r benchmarks/requirements.txt):
+#   python -m benchmarks.bench_routes --rows 1000 100000 1000000
+#   python -m benchmarks.bench_routes --rows 100000 --scenarios export-csv import-csv --repeat 10
+#
+# Cada combinación (escenario, filas) corre en un proceso nuevo con su propia
+# base SQLite (standins.SQLiteConnection detrás de get_db_connection) y fakeredis.
+# Las rutas se llaman con el cliente de pruebas de Flask: se mide la ruta
+# completa (parseo, SQL, escritura, índices) sin la red.
+# Una primera corrida de calentamiento (imports perezosos) no se mide.
+# Reporta filas/s (sobre la mediana), latencia p50/p99 y el pico de RSS; en
+# los escenarios de chat, además los duplicados que descartó la deduplicación
+# (cada corrida envía mensajes nuevos, así que deberían ser 0).
+# Un escenario que falla o supera --timeout se reporta y los demás siguen;
+# al final el código de salida es 1 si alguno falló.
+
+import argparse
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+from queue import Empty
+
+MICROSERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MICROSERVICE_DIR)
+
+from benchmarks.generators import category_chats_payload, iter_chat_messages, write_import_file
+from benchmarks.standins import create_database, install, USUARIO_ID
+
+# Mensajes por chat en category-chats (filas / MESSAGES_PER_CHAT chats)
+MESSAGES_PER_CHAT = 1000
+
+SCENARIOS = (
+    'export-xlsx', 'export-csv', 'export-parquet',
+    'import-xlsx', 'import-csv', 'import-parquet', 'import-upsert',
+    'category-chats', 'chat'
+)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Percentil por rango más cercano
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+# Una respuesta de error (o una importación NDJSON sin línea final) falla el escenario
+# en lugar de medirse como una corrida rápida
+class RouteError(Exception):
+    pass
+
+
+def _json(response, url):
+    if response.status_code != 200:
+        raise RouteError(f'{url} respondió {response.status_code}: {response.get_data(as_text=True)[:300]}')
+    return response.get_json()
+
+
+# Preparar datos y devolver una función que arma cada corrida (fuera de la
+# medición) y retorna el request a medir; el request devuelve (filas, duplicados)
+def _prepare(scenario, n, tmp, client):
+    kind, _, variant = scenario.partition('-')
+
+    if kind == 'export':
+        def run():
+            response = client.post('/export/contacts', json={
+                'usuario_id': USUARIO_ID, 'format': variant, 'stream': True, 'cache': False
+            })
+            return _json(response, '/export/contacts')['total'], None
+        return lambda: run
+
+    if kind == 'import':
+        fmt = 'csv' if variant == 'upsert' else variant
+        filepath = os.path.join(tmp, f'importar.{fmt}')
+        write_import_file(filepath, fmt, n)
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        query = f'?mode=upsert&usuario_id={USUARIO_ID}' if variant == 'upsert' else '?mode=ndjson'
+
+        def run():
+            response = client.post(
+                '/import/contacts' + query,
+                data={'file': (io.BytesIO(content), os.path.basename(filepath))},
+                content_type='multipart/form-data'
+            )
+            if variant == 'upsert':
+                result = _json(response, '/import/contacts')
+                if not result.get('success'):
+                    raise RouteError(f'upsert sin success: {result}')
+                return n, None
+
+            if response.status_code != 200:
+                raise RouteError(f'/import/contacts respondió {response.status_code}: '
+                                 f'{response.get_data(as_text=True)[:300]}')
+            # NDJSON: la última línea debe ser la de totales ({"done": true})
+            lines = response.get_data(as_text=True).splitlines()
+            response.close()
+            last = json.loads(lines[-1]) if lines else {}
+            if not last.get('done'):
+                raise RouteError(f'/import/contacts no terminó: {lines[-1][:300] if lines else "sin respuesta"}')
+            return last['rows'], None
+        return lambda: run
+
+    runs = iter(range(sys.maxsize))
+
+    if scenario == 'category-chats':
+        def next_run():
+            payload = category_chats_payload(max(1, n // MESSAGES_PER_CHAT), min(n, MESSAGES_PER_CHAT),
+                                             run=next(runs))
+            total = sum(len(chat['messages']) for chat in payload['chats'])
+
+            def run():
+                results = _json(client.post('/export/category-chats', json=payload), '/export/category-chats')['results']
+                return total, sum(result.get('duplicates', 0) for result in results)
+            return run
+        return next_run
+
+    def next_run():
+        payload = {
+            'contact_name': 'Contacto 0',
+            'contact_phone': '51900000000',
+            'messages': list(iter_chat_messages(n, run=next(runs)))
+        }
+
+        def run():
+            return n, _json(client.post('/export/chat', json=payload), '/export/chat')['duplicates']
+        return run
+    return next_run
+
+
+def _child(scenario, n, repeat, warmup, queue):
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py usa rutas relativas (../../downloads)
+        workdir = os.path.join(tmp, 'src', 'microservices')
+        os.makedirs(workdir)
+        os.chdir(workdir)
+
+        import app
+        db_path = os.path.join(tmp, 'bench.sqlite')
+        create_database(db_path, n if scenario.startswith('export') else 0)
+        install(app, db_path)
+
+        client = app.app.test_client()
+        next_run = _prepare(scenario, n, tmp, client)
+        for _ in range(warmup):
+            next_run()()
+        base_rss = peak_rss_mb()
+
+        latencies = []
+        rows = 0
+        duplicates = None
+        for _ in range(repeat):
+            run = next_run()
+            start = time.perf_counter()
+            rows, dups = run()
+            latencies.append(time.perf_counter() - start)
+            if dups is not None:
+                duplicates = (duplicates or 0) + dups
+
+        queue.put((rows, latencies, base_rss, peak_rss_mb(), duplicates))
+
+
+# Resultado del proceso hijo; None si terminó sin reportar o venció el plazo
+def _collect(proc, queue, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return queue.get(timeout=min(1, max(deadline - time.monotonic(), 0.01)))
+        except Empty:
+            if time.monotonic() >= deadline:
+                return None
+            if not proc.is_alive():
+                # Pudo reportar justo antes de salir
+                try:
+                    return queue.get(timeout=1)
+                except Empty:
+                    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de rutas del microservicio')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=3600, help='segundos máximos por escenario')
+    args = parser.parse_args()
+
+    ctx = get_context('spawn')
+    print(f"{'escenario':<16}{'filas':>10}{'filas/s':>12}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'RSS base MB':>13}{'RSS pico MB':>13}{'duplicados':>12}")
+    failed = []
+    for n in args.rows:
+        for scenario in args.scenarios:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_child, args=(scenario, n, args.repeat, args.warmup, queue))
+            proc.start()
+            result = _collect(proc, queue, args.timeout)
+            timed_out = result is None and proc.is_alive()
+            if timed_out:
+                proc.terminate()
+            proc.join()
+
+            if result is None or proc.exitcode != 0:
+                reason = f'timeout de {args.timeout:g}s' if timed_out else f'código de salida {proc.exitcode}'
+                failed.append(f'{scenario} ({n} filas): {reason}')
+                print(f'{scenario:<16}{n:>10}  FALLÓ ({reason})')
+                continue
+
+            rows, latencies, base_rss, peak, duplicates = result
+            p50 = percentile(latencies, 50)
+            p99 = percentile(latencies, 99)
+            print(f'{scenario:<16}{rows:>10}{rows / p50:>12.0f}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}'
+                  f'{base_rss:>13.1f}{peak:>13.1f}{"-" if duplicates is None else duplicates:>12}')
+
+    if failed:
+        print('\n❌ Escenarios fallidos:', file=sys.stderr)
+        for failure in failed:
+            print('  -', failure, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
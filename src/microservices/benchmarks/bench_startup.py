@@ -0,0 +1,94 @@
+# Benchmark: arranque del microservicio
+#
+# Uso (desde src/microservices):
+#   python -m benchmarks.bench_startup --runs 5
+#   python -m benchmarks.bench_startup --preload --max-import-ms 800
+#
+# Cada corrida es un proceso nuevo que mide `import app`, el primer /health y el
+# primer request que carga las dependencias pesadas (/import/contacts con un CSV
+# chico). No necesita MySQL ni Redis. Con --max-import-ms termina con código 1
+# si la mediana de la importación supera el límite (para CI).
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+MICROSERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que no deberían cargarse al importar app.py
+HEAVY_MODULES = ('pandas', 'openpyxl', 'pyarrow', 'redis', 'mysql.connector')
+
+SAMPLE_CSV = b'telefono,nombre\n51999000001,Ana\n51999000002,Luis\n'
+
+
+def _child(preload, queue):
+    # app.py usa rutas relativas (../../downloads): correr dentro de un directorio temporal
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = os.path.join(tmp, 'src', 'microservices')
+        os.makedirs(workdir)
+        os.chdir(workdir)
+        sys.path.insert(0, MICROSERVICE_DIR)
+        os.environ['PRELOAD_DEPENDENCIES'] = 'true' if preload else 'false'
+
+        start = time.perf_counter()
+        import app
+        import_s = time.perf_counter() - start
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+        client = app.app.test_client()
+
+        start = time.perf_counter()
+        client.get('/health')
+        health_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post(
+            '/import/contacts?mode=paged',
+            data={'file': (io.BytesIO(SAMPLE_CSV), 'contactos.csv')},
+            content_type='multipart/form-data'
+        )
+        first_import_s = time.perf_counter() - start
+
+        queue.put((import_s, health_s, first_import_s, response.status_code, loaded))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de arranque del microservicio')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--preload', action='store_true', help='Arrancar con PRELOAD_DEPENDENCIES=true')
+    parser.add_argument('--max-import-ms', type=float, default=None)
+    args = parser.parse_args()
+
+    ctx = get_context('spawn')
+    results = []
+    for _ in range(args.runs):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_child, args=(args.preload, queue))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+
+    import_ms = statistics.median(r[0] for r in results) * 1000
+    health_ms = statistics.median(r[1] for r in results) * 1000
+    first_import_ms = statistics.median(r[2] for r in results) * 1000
+    status = results[-1][3]
+    loaded = results[-1][4]
+
+    print(f"{'preload':<10}{'import app ms':>15}{'1er /health ms':>16}{'1er import ms':>15}")
+    print(f"{str(args.preload):<10}{import_ms:>15.1f}{health_ms:>16.1f}{first_import_ms:>15.1f}")
+    print('Módulos pesados cargados al importar:', ', '.join(loaded) or 'ninguno')
+    if status != 200:
+        print('⚠️ /import/contacts respondió', status)
+
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f'❌ La importación tardó {import_ms:.1f} ms (límite {args.max_import_ms:.1f} ms)')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import random
+from datetime import datetime, timedelta
+
+# Generadores de datos sintéticos para los benchmarks
+
+CONTACT_COLUMNS = ['id', 'nombre', 'telefono', 'estado', 'categoria', 'fecha_agregado']
+ESTADOS = ['pendiente', 'agregado', 'bloqueado', 'invalido']
+
+
+# Contactos con la forma de la consulta de /export/contacts
+def iter_contacts(n, seed=42):
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    for i in range(n):
+        yield {
+            'id': i + 1,
+            'nombre': f'Contacto {i}',
+            'telefono': f'519{rng.randrange(10 ** 8):08d}',
+            'estado': ESTADOS[i % len(ESTADOS)],
+            'categoria': f'Categoria {i % 20}',
+            'fecha_agregado': base + timedelta(minutes=i)
+        }
+
+
+CHAT_COLUMNS = ['fecha', 'remitente', 'mensaje', 'tipo']
+FRASES = [
+    'Hola, ¿cómo estás?', 'Gracias por la información', '¿Cuál es el precio?',
+    'Te envío los detalles', 'Perfecto, quedamos así', 'Buenos días'
+]
+
+
+# Mensajes de chat con la forma que envía el backend a /export/chat. Cada `run`
+# tiene ids y horas propios: /export/chat deduplica y descartaría una corrida repetida
+def iter_chat_messages(n, seed=42, run=0):
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1, 8) + timedelta(seconds=30 * n * run)
+    for i in range(n):
+        yield {
+            'messageId': f'BENCH{seed}R{run}M{i}',
+            'fecha': (base + timedelta(seconds=30 * i)).isoformat(),
+            'remitente': 'contacto' if rng.random() < 0.5 else 'yo',
+            'mensaje': rng.choice(FRASES),
+            'tipo': 'texto'
+        }
+
+
+# Payload de /export/category-chats: `contacts` chats de `messages` mensajes
+def category_chats_payload(contacts, messages, seed=42, run=0):
+    rng = random.Random(seed)
+    return {
+        'chats': [
+            {
+                'contact_name': f'Contacto {i}',
+                'contact_phone': f'519{rng.randrange(10 ** 8):08d}',
+                'messages': list(iter_chat_messages(messages, seed=seed + i, run=run))
+            }
+            for i in range(contacts)
+        ]
+    }
+
+
+IMPORT_COLUMNS = ['telefono', 'nombre', 'categoria']
+
+
+# Archivo de importación (xlsx, csv o parquet) con `n` contactos; ~2% inválidos y ~2% repetidos
+def write_import_file(filepath, fmt, n, seed=42):
+    from export_writer import write_rows
+
+    rng = random.Random(seed)
+
+    def rows():
+        previous = None
+        for i in range(n):
+            roll = rng.random()
+            if roll < 0.02:
+                phone = str(rng.randrange(10 ** 4))
+            elif roll < 0.04 and previous:
+                phone = previous
+            else:
+                phone = f'519{rng.randrange(10 ** 8):08d}'
+            previous = phone
+            yield [phone, f'Contacto {i}', f'Categoria {i % 20}']
+
+    return write_rows(fmt, filepath, IMPORT_COLUMNS, rows())
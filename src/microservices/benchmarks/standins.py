@@ -0,0 +1,129 @@
+import sqlite3
+from datetime import datetime
+
+from benchmarks.generators import iter_contacts
+
+# Reemplazos locales de MySQL y Redis para los benchmarks.
+# SQLiteConnection imita la parte de mysql.connector que usa el microservicio
+# (cursor(dictionary=..., buffered=...), parámetros %s, executemany, NOW()),
+# así las rutas corren sin cambios; Redis se reemplaza con fakeredis.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS categorias (
+    id INTEGER PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    nombre TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contactos (
+    id INTEGER PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    categoria_id INTEGER,
+    nombre TEXT,
+    telefono TEXT NOT NULL,
+    estado TEXT DEFAULT 'pendiente',
+    fecha_agregado TEXT DEFAULT CURRENT_TIMESTAMP,
+    fecha_actualizado TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_usuario ON contactos (usuario_id);
+CREATE INDEX IF NOT EXISTS idx_categoria ON contactos (categoria_id);
+CREATE INDEX IF NOT EXISTS idx_telefono ON contactos (telefono);
+CREATE INDEX IF NOT EXISTS idx_usuario_actualizado ON contactos (usuario_id, fecha_actualizado);
+'''
+
+USUARIO_ID = 1
+CATEGORIAS = 20
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class SQLiteCursor:
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        self.dictionary = dictionary
+
+    def execute(self, query, params=()):
+        self._cursor.execute(query.replace('%s', '?'), list(params))
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(query.replace('%s', '?'), [list(p) for p in seq_params])
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def _rows(self, rows):
+        if not self.dictionary:
+            return rows
+        columns = [col[0] for col in self._cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._rows([row])[0] if row is not None else None
+
+    def fetchmany(self, size):
+        return self._rows(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, db_path):
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.create_function('NOW', 0, _now)
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SQLiteCursor(self._conn, dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    # sqlite3 no deja resultados pendientes en la conexión
+    def consume_results(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+# Crear la base con `n` contactos del usuario USUARIO_ID
+def create_database(db_path, n, seed=42):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        'INSERT INTO categorias (id, usuario_id, nombre) VALUES (?, ?, ?)',
+        [(i + 1, USUARIO_ID, f'Categoria {i}') for i in range(CATEGORIAS)]
+    )
+    conn.executemany(
+        '''INSERT INTO contactos (usuario_id, categoria_id, nombre, telefono, estado, fecha_agregado, fecha_actualizado)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        (
+            (USUARIO_ID, c['id'] % CATEGORIAS + 1, c['nombre'], c['telefono'], c['estado'],
+             c['fecha_agregado'].strftime('%Y-%m-%d %H:%M:%S'),
+             c['fecha_agregado'].strftime('%Y-%m-%d %H:%M:%S'))
+            for c in iter_contacts(n, seed)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+# Conectar el módulo app a la base SQLite y a fakeredis
+def install(app_module, db_path):
+    import fakeredis
+
+    app_module.get_db_connection = lambda: SQLiteConnection(db_path)
+    app_module.redis_client._client = fakeredis.FakeRedis(decode_responses=True)
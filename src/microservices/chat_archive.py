@@ -0,0 +1,92 @@
+import os
+import io
+import zipfile
+from chat_store import (
+    list_days, folder_phone, materialize_xlsx, phone_shard, is_shard_name, contact_folder_path, EXCEL_EXT
+)
+
+# ZIP en streaming del archivo de chats.
+# El ZIP se escribe sobre un destino no posicionable: zipfile usa descriptores
+# de datos y cada bloque comprimido se entrega al response apenas se produce,
+# así el archivo completo nunca está en memoria.
+
+ZIP_CHUNK_SIZE = 64 * 1024
+
+
+class _ZipSink(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+# Generar el ZIP de (nombre en el zip, ruta en disco) bloque a bloque
+def stream_zip(files):
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for arcname, path in files:
+            size = os.path.getsize(path)
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+
+            with open(path, 'rb') as src, zf.open(zinfo, 'w', force_zip64=size > zipfile.ZIP64_LIMIT) as dst:
+                while True:
+                    block = src.read(ZIP_CHUNK_SIZE)
+                    if not block:
+                        break
+                    dst.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+
+            data = sink.drain()
+            if data:
+                yield data
+
+    # Directorio central
+    data = sink.drain()
+    if data:
+        yield data
+
+
+# Carpetas de contacto cuyo teléfono está en `phones`: se lee solo el
+# subdirectorio de cada teléfono, más las carpetas planas aún sin migrar
+def folders_for_phones(chats_folder, phones):
+    phones = set(str(phone) for phone in phones)
+    names = set()
+    for phone in phones:
+        shard_path = os.path.join(chats_folder, phone_shard(phone))
+        if os.path.isdir(shard_path):
+            names.update(
+                entry.name for entry in os.scandir(shard_path)
+                if entry.is_dir() and folder_phone(entry.name) == phone
+            )
+    names.update(
+        entry.name for entry in os.scandir(chats_folder)
+        if entry.is_dir() and not is_shard_name(entry.name) and folder_phone(entry.name) in phones
+    )
+    return sorted(names)
+
+
+# Archivos diarios (.xlsx materializado) de las carpetas, filtrados por fecha
+def iter_chat_files(chats_folder, folder_names, date_from=None, date_to=None, on_file=None):
+    for folder_name in folder_names:
+        folder_path = contact_folder_path(chats_folder, folder_name)
+        if not os.path.isdir(folder_path):
+            continue
+        for _day, stem in list_days(folder_path, date_from, date_to):
+            xlsx_path = materialize_xlsx(os.path.join(folder_path, stem + EXCEL_EXT))
+            if xlsx_path:
+                if on_file:
+                    on_file(xlsx_path)
+                yield f'{folder_name}/{stem}{EXCEL_EXT}', xlsx_path
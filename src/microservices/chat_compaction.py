@@ -0,0 +1,220 @@
+import os
+import json
+import time
+from datetime import datetime, date, timedelta
+from chat_store import (
+    LOG_EXT, EXCEL_EXT, parse_day, iter_log, read_manifest, write_manifest, archive_path,
+    iter_contact_folders, contact_folder_path
+)
+from chat_locks import chat_lock, ChatLockTimeout
+from export_writer import read_xlsx
+
+# Compactación del historial de chats.
+# Los días cerrados (más antiguos que after_days) de cada contacto se pasan a
+# un Parquet mensual comprimido con zstd, un row group por día, y se borran
+# sus logs y Excel diarios: ~30 archivos por contacto y mes pasan a uno.
+# Columnas: day (YYYY-MM-DD), line (orden dentro del día), message (JSON).
+#
+# Orden seguro ante caídas: el log se renombra a .compacting (los appends
+# nuevos crean otro log), se escribe el Parquet, luego el manifiesto y al
+# final se borran los originales. Un .compacting de un día que ya figura en
+# el manifiesto quedó de una corrida interrumpida y solo se borra.
+# Cada carpeta se compacta bajo el lock del contacto (chat_locks): un append
+# concurrente espera y escribe después en un log nuevo.
+
+COMPACTING_EXT = '.compacting'
+KEY_LAST_RUN = 'compaction:last_run'
+KEY_LOCK = 'compaction:lock'
+
+
+def _day_of(filename):
+    if filename.endswith(COMPACTING_EXT):
+        filename = filename[:-len(COMPACTING_EXT)]
+    return parse_day(filename)
+
+
+# Mensajes ya compactados de un mes, solo de los días que lista el manifiesto
+def _read_archive(path, days):
+    import pyarrow.parquet as pq
+
+    if not os.path.exists(path):
+        return {}
+    table = pq.read_table(path)
+    result = {}
+    for day, message in zip(table.column('day').to_pylist(), table.column('message').to_pylist()):
+        if day in days:
+            result.setdefault(day, []).append(message)
+    return result
+
+
+def _write_archive(path, messages_by_day):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([('day', pa.string()), ('line', pa.int32()), ('message', pa.string())])
+    tmp_path = path + '.tmp'
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+            for day in sorted(messages_by_day):
+                messages = messages_by_day[day]
+                writer.write_table(pa.table({
+                    'day': [day] * len(messages),
+                    'line': list(range(1, len(messages) + 1)),
+                    'message': messages
+                }, schema=schema))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ChatCompactor:
+    def __init__(self, redis_client, chats_folder, after_days=2, on_compacted=None):
+        self.redis = redis_client
+        self.chats_folder = os.path.abspath(chats_folder)
+        self.after_days = after_days
+        # on_compacted(ruta del Parquet, [archivos borrados]) para índices y retención
+        self.on_compacted = on_compacted
+
+    # Compactar los días anteriores a `cutoff` de una carpeta de contacto
+    def compact_folder(self, folder_path, cutoff):
+        manifest = read_manifest(folder_path)
+
+        # Días a compactar por mes: {mes: {día: [archivos fuente]}}
+        pending = {}
+        stale = []
+        for entry in os.scandir(folder_path):
+            if not entry.is_file():
+                continue
+            day = _day_of(entry.name)
+            if day is None or day >= cutoff:
+                continue
+            month = day.strftime('%Y-%m')
+            archived = day.isoformat() in manifest['months'].get(month, {}).get('days', {})
+
+            if entry.name.endswith(COMPACTING_EXT) and archived:
+                stale.append(entry.path)
+            elif entry.name.endswith((LOG_EXT, COMPACTING_EXT)):
+                pending.setdefault(month, {}).setdefault(day, []).append(entry.path)
+            elif entry.name.endswith(EXCEL_EXT):
+                # Excel materializado (se regenera desde el Parquet) o del formato anterior
+                pending.setdefault(month, {}).setdefault(day, []).append(entry.path)
+
+        for path in stale:
+            os.remove(path)
+
+        report = {'months': 0, 'days': 0, 'messages': 0, 'removed_files': len(stale)}
+        for month, days in sorted(pending.items()):
+            # Solo días con log (o Excel del formato anterior); un Excel de un día
+            # ya compactado es una descarga y se borra sin volver a leerlo
+            month_entry = manifest['months'].get(month, {'days': {}})
+            sources = {}
+            for day, paths in days.items():
+                logs = [p for p in paths if not p.endswith(EXCEL_EXT)]
+                if logs or day.isoformat() not in month_entry['days']:
+                    sources[day] = paths
+            removable = [p for day, paths in days.items() if day not in sources for p in paths]
+
+            if sources:
+                path = archive_path(folder_path, min(sources))
+                messages_by_day = _read_archive(path, month_entry['days'])
+                to_remove = []
+
+                for day, paths in sorted(sources.items()):
+                    messages = messages_by_day.setdefault(day.isoformat(), [])
+                    logs = sorted(p for p in paths if not p.endswith(EXCEL_EXT))
+                    for log_path in logs:
+                        if log_path.endswith(LOG_EXT):
+                            compacting = log_path + COMPACTING_EXT
+                            os.replace(log_path, compacting)
+                            to_remove.append(compacting)
+                            log_path = compacting
+                        else:
+                            to_remove.append(log_path)
+                        messages.extend(
+                            json.dumps(msg, ensure_ascii=False, default=str) for msg in iter_log(log_path)
+                        )
+                    if not logs:
+                        # Día del formato anterior: solo existe el Excel
+                        columns, rows = read_xlsx(paths[0])
+                        messages.extend(
+                            json.dumps({c: v for c, v in zip(columns, row) if v is not None},
+                                       ensure_ascii=False, default=str)
+                            for row in rows
+                        )
+                    to_remove.extend(p for p in paths if p.endswith(EXCEL_EXT))
+                    report['days'] += 1
+
+                _write_archive(path, messages_by_day)
+                manifest['months'][month] = {
+                    'file': os.path.basename(path),
+                    'days': {day: len(messages) for day, messages in sorted(messages_by_day.items())},
+                    'messages': sum(len(messages) for messages in messages_by_day.values()),
+                    'bytes': os.path.getsize(path)
+                }
+                write_manifest(folder_path, manifest)
+                report['months'] += 1
+                report['messages'] += sum(len(messages_by_day[d.isoformat()]) for d in sources)
+            else:
+                path = None
+                to_remove = []
+
+            removed = []
+            for remove_path in to_remove + removable:
+                try:
+                    os.remove(remove_path)
+                except FileNotFoundError:
+                    continue
+                # Los índices conocen el log por su nombre original
+                removed.append(remove_path[:-len(COMPACTING_EXT)]
+                               if remove_path.endswith(COMPACTING_EXT) else remove_path)
+            report['removed_files'] += len(removed)
+
+            if self.on_compacted:
+                self.on_compacted(path, removed)
+
+        return report
+
+    # Compactar todas las carpetas de contacto
+    def compact(self, after_days=None):
+        start = time.time()
+        after_days = self.after_days if after_days is None else after_days
+        cutoff = date.today() - timedelta(days=after_days)
+
+        totals = {'folders': 0, 'busy_folders': 0, 'months': 0, 'days': 0, 'messages': 0, 'removed_files': 0}
+        for folder_name, _folder_path in iter_contact_folders(self.chats_folder):
+            try:
+                with chat_lock(folder_name):
+                    # Resuelta bajo el lock: la migración pudo moverla
+                    result = self.compact_folder(contact_folder_path(self.chats_folder, folder_name), cutoff)
+            except ChatLockTimeout:
+                # Un contacto con escrituras largas se compacta en la próxima corrida
+                totals['busy_folders'] += 1
+                continue
+            totals['folders'] += 1
+            for key, value in result.items():
+                totals[key] += value
+
+        report = {
+            'finished_at': datetime.now().isoformat(),
+            'elapsed_seconds': round(time.time() - start, 3),
+            'cutoff': cutoff.isoformat(),
+            **totals
+        }
+        self.redis.set(KEY_LAST_RUN, json.dumps(report))
+        return report
+
+    def last_run(self):
+        report = self.redis.get(KEY_LAST_RUN)
+        return json.loads(report) if report else None
+
+    # Bucle periódico; el lock en Redis evita compactaciones simultáneas entre pods
+    def run_forever(self, interval):
+        while True:
+            if self.redis.set(KEY_LOCK, os.getpid(), nx=True, ex=max(int(interval), 60)):
+                try:
+                    report = self.compact()
+                    print('🗜️ Compactación:', report['days'], 'días,', report['removed_files'], 'archivos menos')
+                except Exception as e:
+                    print('❌ Error en compactación:', e)
+            time.sleep(interval)
@@ -0,0 +1,150 @@
+import os
+import json
+import fcntl
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from chat_fields import ID_FIELDS, TIME_FIELDS, SENDER_FIELDS, TEXT_FIELDS, first_field
+
+# Deduplicación de mensajes al agregarlos al historial de chats.
+# Node reintenta /export/chat y /export/category-chats ante timeouts y cada
+# reintento vuelve a enviar el mismo lote. Cada mensaje tiene una clave (su id
+# o, sin id, la hora + la dirección + el texto) y cada contacto guarda en
+# dedup.idx, junto a sus logs y Parquet, el digest de 8 bytes de cada clave ya
+# escrita. Cada proceso carga el índice una vez y después lee solo lo que otros
+# procesos agregaron al final, así deduplicar cuesta O(lote) sin releer los logs.
+#
+# Formato de dedup.idx: cabecera INDEX_HEADER seguida de digests de DIGEST_SIZE bytes.
+# Un flock exclusivo sobre el archivo cubre la consulta, el append al log y el
+# registro de los digests, también entre procesos.
+
+DEDUP_NAME = 'dedup.idx'
+INDEX_HEADER = b'DEDUP1\n\0'
+DIGEST_SIZE = 8
+
+# Índices de contacto que cada proceso mantiene en memoria
+MAX_CACHED_INDEXES = int(os.getenv('CHAT_DEDUP_CACHE', 256))
+
+
+# Clave de deduplicación de un mensaje; None si no tiene id ni hora
+# (sin ellas no se distingue un reintento de un mensaje repetido, como "ok")
+def message_key(message):
+    if not isinstance(message, dict):
+        return None
+    message_id = first_field(message, ID_FIELDS)
+    if message_id is not None:
+        return json.dumps(['id', str(message_id)])
+
+    sent_at = first_field(message, TIME_FIELDS)
+    if sent_at is None:
+        return None
+    body = first_field(message, TEXT_FIELDS)
+    if body is None:
+        body = json.dumps(message, sort_keys=True, ensure_ascii=False, default=str)
+    return json.dumps(['msg', str(sent_at), str(first_field(message, SENDER_FIELDS)), str(body)], ensure_ascii=False)
+
+
+def message_digest(message):
+    key = message_key(message)
+    if key is None:
+        return None
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+class DedupIndex:
+    def __init__(self, folder_path):
+        self.path = os.path.join(folder_path, DEDUP_NAME)
+        self.digests = set()
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    # Leer los digests que otros procesos agregaron desde la última lectura
+    def _refresh(self):
+        size = os.fstat(self._file.fileno()).st_size
+        # Un digest a medio escribir (caída durante el append) se descarta
+        usable = size - (size - len(INDEX_HEADER)) % DIGEST_SIZE
+        if usable < size:
+            self._file.truncate(usable)
+        if usable < self.bytes_read:
+            # El índice se reconstruyó: volver a leerlo completo
+            self.digests.clear()
+            self.bytes_read = 0
+        if self.bytes_read == 0:
+            self.bytes_read = len(INDEX_HEADER)
+        if usable > self.bytes_read:
+            self._file.seek(self.bytes_read)
+            data = self._file.read(usable - self.bytes_read)
+            self.digests.update(data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE))
+            self.bytes_read = usable
+
+    # Mensajes del lote que aún no están en el historial (ni repetidos dentro del lote)
+    # y sus digests, para registrarlos con add() después de escribirlos
+    def select(self, messages):
+        fresh = []
+        digests = []
+        seen = set()
+        for message in messages:
+            digest = message_digest(message)
+            if digest is None:
+                fresh.append(message)
+                continue
+            if digest in self.digests or digest in seen:
+                continue
+            seen.add(digest)
+            fresh.append(message)
+            digests.append(digest)
+        return fresh, digests
+
+    def add(self, digests):
+        if not digests:
+            return
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(b''.join(digests))
+        self._file.flush()
+        self.digests.update(digests)
+        self.bytes_read += len(digests) * DIGEST_SIZE
+
+    # Lock exclusivo del contacto con el índice al día. `seed` devuelve los
+    # mensajes ya guardados y solo se usa la primera vez (carpetas anteriores al índice)
+    @contextmanager
+    def locked(self, seed=None):
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(fd, 'r+b') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                self._file = f
+                try:
+                    if os.fstat(fd).st_size < len(INDEX_HEADER):
+                        f.truncate(0)
+                        f.write(INDEX_HEADER)
+                        f.flush()
+                        self.digests.clear()
+                        self.bytes_read = 0
+                        self._refresh()
+                        if seed is not None:
+                            self.add({digest for digest in map(message_digest, seed()) if digest is not None})
+                    self._refresh()
+                    yield self
+                finally:
+                    self._file = None
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+# Índice de la carpeta de un contacto (LRU de MAX_CACHED_INDEXES por proceso)
+def get_index(folder_path):
+    folder_path = os.path.abspath(folder_path)
+    with _indexes_lock:
+        index = _indexes.get(folder_path)
+        if index is None:
+            index = _indexes[folder_path] = DedupIndex(folder_path)
+            while len(_indexes) > MAX_CACHED_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(folder_path)
+        return index
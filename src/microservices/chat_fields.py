@@ -0,0 +1,18 @@
+# Campos de un mensaje de chat con el id, la hora, el remitente y el texto.
+# Node envía mensajes de WhatsApp (messageId, timestamp, fromMe, text) y de
+# formatos anteriores en español; se usa el primero que exista. Compartidos por
+# la deduplicación y la búsqueda: el orden es parte de la clave de dedup.idx.
+
+ID_FIELDS = ('messageId', 'message_id', 'id', 'wa_id')
+TIME_FIELDS = ('timestamp', 'fecha', 'date', 'hora')
+SENDER_FIELDS = ('fromMe', 'direction', 'direccion', 'remitente', 'from', 'sender', 'de')
+TEXT_FIELDS = ('text', 'mensaje', 'message', 'body', 'contenido')
+
+
+# Valor del primer campo presente y no vacío; None si no hay ninguno
+def first_field(message, fields):
+    for field in fields:
+        value = message.get(field)
+        if value not in (None, ''):
+            return value
+    return None
@@ -0,0 +1,136 @@
+import os
+import time
+import zlib
+import fcntl
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from lazy_redis import LazyRedis
+
+# Locks por contacto para escribir su historial (append, compactación, migración).
+# Niveles, del más barato al más amplio:
+#   - hilos del proceso: CHAT_LOCK_STRIPES locks, una franja por hash del contacto
+#   - procesos del nodo: flock sobre el archivo de la misma franja en CHAT_LOCK_FOLDER
+#   - pods (CHAT_LOCK_REDIS=true): además un lock en Redis por contacto
+# Contactos distintos se escriben en paralelo en todos los workers y nodos; dos
+# contactos que caen en la misma franja solo se esperan dentro del mismo nodo.
+# La clave es el nombre de la carpeta ({nombre}_{telefono}), no su ruta, así el
+# lock sigue siendo el mismo durante la migración a carpetas repartidas.
+
+CHAT_LOCK_STRIPES = int(os.getenv('CHAT_LOCK_STRIPES', 256))
+CHAT_LOCK_FOLDER = os.getenv('CHAT_LOCK_FOLDER', os.path.join(tempfile.gettempdir(), 'chat_locks'))
+CHAT_LOCK_REDIS = os.getenv('CHAT_LOCK_REDIS', 'false').lower() == 'true'
+# Segundos que vive el lock de Redis (debe cubrir la compactación de una carpeta)
+# y segundos máximos de espera por un lock ocupado
+CHAT_LOCK_TTL = float(os.getenv('CHAT_LOCK_TTL', 120))
+CHAT_LOCK_WAIT = float(os.getenv('CHAT_LOCK_WAIT', 30))
+
+KEY_PREFIX = 'chat:lock:'
+
+logger = logging.getLogger(__name__)
+
+
+class ChatLockTimeout(Exception):
+    pass
+
+
+class ChatLocks:
+    def __init__(self, lock_folder, stripes=256, redis_client=None, ttl=120, wait=30):
+        self.lock_folder = lock_folder
+        self.stripes = stripes
+        self.redis = redis_client
+        self.ttl = ttl
+        self.wait = wait
+        self._pid = None
+        self._init_lock = threading.Lock()
+
+    # Locks y archivos propios de este proceso: tras un fork (ProcessPoolExecutor)
+    # el descriptor heredado comparte el flock con el padre y no lo excluiría
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            with self._init_lock:
+                if self._pid != os.getpid():
+                    os.makedirs(self.lock_folder, exist_ok=True)
+                    self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+                    self._files = {}
+                    self._files_lock = threading.Lock()
+                    self._pid = os.getpid()
+
+    def _stripe_file(self, stripe):
+        with self._files_lock:
+            f = self._files.get(stripe)
+            if f is None:
+                f = self._files[stripe] = open(os.path.join(self.lock_folder, f'{stripe:04d}.lock'), 'a+b')
+            return f
+
+    # flock sin bloquear hasta `deadline`: un proceso colgado con la franja no
+    # deja a los demás esperando para siempre
+    def _flock(self, f, folder_name, deadline):
+        delay = 0.005
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ChatLockTimeout(f'Chat {folder_name} ocupado por otro proceso')
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.1)
+
+    @contextmanager
+    def _redis_lock(self, folder_name, deadline):
+        lock = self.redis.lock(KEY_PREFIX + folder_name, timeout=self.ttl,
+                               blocking_timeout=max(deadline - time.monotonic(), 0))
+        if not lock.acquire():
+            raise ChatLockTimeout(f'Chat {folder_name} ocupado por otro nodo')
+        try:
+            yield
+        finally:
+            # Si el lock venció mientras se escribía, otro nodo pudo tomarlo: se avisa
+            try:
+                lock.release()
+            except Exception as e:
+                logger.warning('Lock de chat vencido: %s (%s)', folder_name, e)
+
+    # Lock exclusivo del historial de un contacto; los tres niveles comparten
+    # el plazo de `wait` segundos
+    @contextmanager
+    def hold(self, folder_name):
+        self._ensure_process()
+        deadline = time.monotonic() + self.wait
+        stripe = zlib.crc32(folder_name.encode('utf-8')) % self.stripes
+        thread_lock = self._thread_locks[stripe]
+        if not thread_lock.acquire(timeout=self.wait):
+            raise ChatLockTimeout(f'Chat {folder_name} ocupado')
+        try:
+            f = self._stripe_file(stripe)
+            self._flock(f, folder_name, deadline)
+            try:
+                if self.redis is not None:
+                    with self._redis_lock(folder_name, deadline):
+                        yield
+                else:
+                    yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        finally:
+            thread_lock.release()
+
+
+_locks = ChatLocks(
+    CHAT_LOCK_FOLDER,
+    stripes=CHAT_LOCK_STRIPES,
+    redis_client=LazyRedis(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379))
+    ) if CHAT_LOCK_REDIS else None,
+    ttl=CHAT_LOCK_TTL,
+    wait=CHAT_LOCK_WAIT
+)
+
+
+# Lock del contacto con la configuración del entorno (también en los procesos del pool)
+def chat_lock(folder_name):
+    return _locks.hold(folder_name)
@@ -0,0 +1,119 @@
+import os
+import time
+from itertools import islice
+from chat_store import LOG_EXT, EXCEL_EXT, phone_shard, folder_phone, is_shard_name
+from chat_dedup import DEDUP_NAME, INDEX_HEADER
+from chat_locks import chat_lock, ChatLockTimeout
+
+# Migración en línea de las carpetas planas (CHATS_FOLDER/{nombre}_{telefono})
+# a las repartidas por hash del teléfono (CHATS_FOLDER/ab/cd/{nombre}_{telefono}).
+# Cada carpeta se mueve con un rename (atómico en el mismo sistema de archivos)
+# mientras la API sigue atendiendo: contact_folder_path resuelve ambas rutas.
+# Es reanudable: el trabajo pendiente son las carpetas planas que quedan, así
+# que basta con volver a ejecutarla tras una interrupción.
+#
+# Cada carpeta se mueve bajo el lock del contacto (chat_locks), el mismo que
+# toman los appends antes de resolver la ruta. Si aun así aparece una carpeta
+# plana junto a la repartida (por ejemplo, varios nodos sin CHAT_LOCK_REDIS),
+# se fusionan: los logs del mismo día se concatenan, dedup.idx suma sus
+# digests y los Excel materializados se descartan.
+
+
+class ChatFolderMigration:
+    def __init__(self, chats_folder, on_moved=None):
+        self.chats_folder = os.path.abspath(chats_folder)
+        # on_moved(ruta anterior, ruta nueva, fusionado) por archivo, para índices y retención
+        self.on_moved = on_moved
+
+    # Carpetas planas pendientes (se detiene tras `limit` para no listar todo el directorio)
+    def pending(self, limit=None):
+        folders = (
+            entry.name for entry in os.scandir(self.chats_folder)
+            if entry.is_dir() and not is_shard_name(entry.name)
+        )
+        return list(islice(folders, limit))
+
+    def _merge_file(self, src, dst):
+        with open(src, 'rb') as f_src, open(dst, 'ab') as f_dst:
+            if os.path.basename(src) == DEDUP_NAME:
+                f_src.seek(len(INDEX_HEADER))
+            while True:
+                block = f_src.read(1024 * 1024)
+                if not block:
+                    break
+                f_dst.write(block)
+        os.remove(src)
+
+    # Mover una carpeta plana a su subdirectorio; devuelve los archivos movidos
+    def migrate_folder(self, folder_name):
+        with chat_lock(folder_name):
+            return self._migrate_folder(folder_name)
+
+    def _migrate_folder(self, folder_name):
+        src = os.path.join(self.chats_folder, folder_name)
+        dst_parent = os.path.join(self.chats_folder, phone_shard(folder_phone(folder_name)))
+        dst = os.path.join(dst_parent, folder_name)
+        os.makedirs(dst_parent, exist_ok=True)
+
+        moved = []
+        if not os.path.exists(dst):
+            names = os.listdir(src)
+            os.rename(src, dst)
+            moved = [(os.path.join(src, name), os.path.join(dst, name), False) for name in names]
+        else:
+            for entry in os.scandir(src):
+                target = os.path.join(dst, entry.name)
+                if not os.path.exists(target):
+                    os.rename(entry.path, target)
+                    moved.append((entry.path, target, False))
+                elif entry.name.endswith(LOG_EXT) or entry.name == DEDUP_NAME:
+                    self._merge_file(entry.path, target)
+                    moved.append((entry.path, target, True))
+                elif entry.name.endswith(EXCEL_EXT):
+                    # Se regenera desde el log al descargar
+                    os.remove(entry.path)
+                    moved.append((entry.path, target, True))
+
+        if self.on_moved:
+            for old_path, new_path, merged in moved:
+                self.on_moved(old_path, new_path, merged)
+
+        # Con un archivo en conflicto (manifiesto o Parquet) la carpeta no queda
+        # vacía: OSError y se reporta en `failed` para revisarla a mano
+        if os.path.exists(src):
+            os.rmdir(src)
+        return len(moved)
+
+    # Migrar en lotes de `batch_size` carpetas, con una pausa entre lotes para
+    # no competir con la API; max_batches=0 migra hasta terminar
+    def run(self, batch_size=500, max_batches=0, pause=0.0, progress=None):
+        start = time.time()
+        folders = 0
+        files = 0
+        failed = set()
+        batches = 0
+        while not max_batches or batches < max_batches:
+            names = [name for name in self.pending(batch_size + len(failed)) if name not in failed][:batch_size]
+            if not names:
+                break
+            for name in names:
+                try:
+                    files += self.migrate_folder(name)
+                    folders += 1
+                except (OSError, ChatLockTimeout) as e:
+                    print('❌ Error migrando', name, '-', e)
+                    failed.add(name)
+            batches += 1
+            if progress:
+                progress(folders, files)
+            if pause:
+                time.sleep(pause)
+
+        return {
+            'folders': folders,
+            'files': files,
+            'failed': sorted(failed),
+            'batches': batches,
+            'remaining': len(self.pending(1)) > 0,
+            'elapsed_seconds': round(time.time() - start, 3)
+        }
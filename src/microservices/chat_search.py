@@ -0,0 +1,402 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from chat_store import LOG_EXT, EXCEL_EXT, ARCHIVE_EXT, parse_day, folder_phone, read_manifest, archived_days
+from export_writer import read_xlsx
+from chat_fields import TIME_FIELDS, SENDER_FIELDS, TEXT_FIELDS, first_field
+
+# Búsqueda de texto completo sobre el historial de chats (SQLite FTS5).
+# Cada log diario se indexa de forma incremental: indexed_logs guarda hasta qué
+# byte se leyó, así indexar después de cada append solo procesa los mensajes
+# nuevos. Las búsquedas devuelven resultados ordenados por relevancia (bm25)
+# con fragmentos resaltados, filtrables por contacto, teléfono y fechas.
+# Los Parquet mensuales y los Excel del formato anterior se indexan completos
+# desde reindex(); indexed_logs guarda su tamaño para no releerlos sin cambios.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    day TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    sender TEXT,
+    sent_at TEXT,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_file ON chat_messages (file);
+CREATE INDEX IF NOT EXISTS idx_messages_phone_day ON chat_messages (phone, day);
+CREATE INDEX IF NOT EXISTS idx_messages_day ON chat_messages (day);
+
+CREATE TABLE IF NOT EXISTS indexed_logs (
+    file TEXT PRIMARY KEY,
+    bytes_read INTEGER NOT NULL,
+    lines INTEGER NOT NULL
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_fts USING fts5(
+    text,
+    content='chat_messages',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS chat_messages_ai AFTER INSERT ON chat_messages BEGIN
+    INSERT INTO chat_fts (rowid, text) VALUES (NEW.id, NEW.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS chat_messages_ad AFTER DELETE ON chat_messages BEGIN
+    INSERT INTO chat_fts (chat_fts, rowid, text) VALUES ('delete', OLD.id, OLD.text);
+END;
+'''
+
+MAX_PAGE_SIZE = 200
+
+
+class ChatSearchError(Exception):
+    pass
+
+
+def _first(message, fields):
+    value = first_field(message, fields)
+    return None if value is None else str(value)
+
+
+# Remitente de un mensaje; fromMe de WhatsApp se muestra como en el backend
+# ('YO' o el nombre del contacto de la carpeta)
+def message_sender(message, folder):
+    sender = first_field(message, SENDER_FIELDS)
+    if isinstance(sender, bool):
+        return 'YO' if sender else folder.rsplit('_', 1)[0].replace('_', ' ')
+    return None if sender is None else str(sender)
+
+
+# Texto indexable de un mensaje; sin campo conocido se usan todos los valores de texto
+def message_text(message):
+    text = _first(message, TEXT_FIELDS)
+    if text is None:
+        text = ' '.join(str(value) for value in message.values() if isinstance(value, str))
+    return text
+
+
+# Consulta del usuario a expresión FTS5: cada palabra entre comillas (AND
+# implícito) y un * final como prefijo; evita errores de sintaxis de FTS5
+def match_expression(query):
+    terms = []
+    for word in query.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+class ChatSearchIndex:
+    def __init__(self, db_path, chats_folder):
+        self.db_path = db_path
+        self.chats_folder = os.path.abspath(chats_folder)
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    # Una conexión por hilo, igual que FileIndex
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(SCHEMA)
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def _rel(self, path):
+        return os.path.relpath(os.path.abspath(path), self.chats_folder).replace(os.sep, '/')
+
+    # Nombre de la carpeta del contacto, sin los subdirectorios de reparto
+    def _folder(self, rel):
+        return rel.rsplit('/', 2)[-2] if '/' in rel else ''
+
+    # Fila de chat_messages de un mensaje; None si no tiene texto indexable
+    def _row(self, rel, folder, day, line, message):
+        if not isinstance(message, dict):
+            return None
+        text = message_text(message)
+        if not text:
+            return None
+        return (rel, folder, folder_phone(folder), day, line,
+                message_sender(message, folder), _first(message, TIME_FIELDS), text)
+
+    def _insert(self, conn, rows):
+        conn.executemany(
+            '''INSERT INTO chat_messages (file, folder, phone, day, line, sender, sent_at, text)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            rows
+        )
+
+    # Indexar los mensajes agregados a un log desde la última vez
+    def index_log(self, log_path):
+        if not log_path or not log_path.endswith(LOG_EXT):
+            return 0
+        day = parse_day(os.path.basename(log_path))
+        if day is None:
+            return 0
+
+        rel = self._rel(log_path)
+        folder = self._folder(rel)
+        conn = self._conn()
+
+        # BEGIN IMMEDIATE: un solo escritor por log aunque haya varios procesos
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT bytes_read, lines FROM indexed_logs WHERE file = ?', (rel,)).fetchone()
+            offset, lines = row or (0, 0)
+
+            try:
+                size = os.path.getsize(log_path)
+            except FileNotFoundError:
+                size = 0
+
+            # El log se reescribió o se borró: reindexar desde cero
+            if size < offset:
+                conn.execute('DELETE FROM chat_messages WHERE file = ?', (rel,))
+                offset, lines = 0, 0
+
+            # Un log nuevo incluye el Excel del formato anterior del mismo día
+            # (append_chat lo migra): sus mensajes ya no se indexan desde el Excel
+            if offset == 0:
+                legacy = rel[:-len(LOG_EXT)] + EXCEL_EXT
+                conn.execute('DELETE FROM chat_messages WHERE file = ?', (legacy,))
+                conn.execute('DELETE FROM indexed_logs WHERE file = ?', (legacy,))
+
+            data = b''
+            if size > offset:
+                with open(log_path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(size - offset)
+                # Solo líneas completas: un append concurrente puede estar a mitad
+                data = data[:data.rfind(b'\n') + 1]
+
+            rows = []
+            for raw in data.splitlines():
+                if not raw.strip():
+                    continue
+                lines += 1
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                row = self._row(rel, folder, day.isoformat(), lines, message)
+                if row:
+                    rows.append(row)
+
+            self._insert(conn, rows)
+            conn.execute(
+                '''INSERT INTO indexed_logs VALUES (?, ?, ?)
+                   ON CONFLICT (file) DO UPDATE SET bytes_read = excluded.bytes_read, lines = excluded.lines''',
+                (rel, offset + len(data), lines)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(rows)
+
+    # Indexar un archivo completo si cambió de tamaño desde la última vez; sus
+    # filas reemplazan a las anteriores (incluidas las de logs ya compactados en él).
+    # `read` devuelve (día ISO, línea, mensaje) de cada mensaje
+    def _index_whole(self, path, read):
+        rel = self._rel(path)
+        size = os.path.getsize(path)
+        conn = self._conn()
+        row = conn.execute('SELECT bytes_read FROM indexed_logs WHERE file = ?', (rel,)).fetchone()
+        if row and row[0] == size:
+            return 0
+
+        folder = self._folder(rel)
+        rows = [row for row in (self._row(rel, folder, *item) for item in read()) if row]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM chat_messages WHERE file = ?', (rel,))
+            self._insert(conn, rows)
+            conn.execute(
+                '''INSERT INTO indexed_logs VALUES (?, ?, ?)
+                   ON CONFLICT (file) DO UPDATE SET bytes_read = excluded.bytes_read, lines = excluded.lines''',
+                (rel, size, len(rows))
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(rows)
+
+    # Indexar un Parquet mensual (solo los días que lista el manifiesto)
+    def index_archive(self, archive):
+        folder_path = os.path.dirname(archive)
+        filename = os.path.basename(archive)
+        days = set()
+        for month in read_manifest(folder_path)['months'].values():
+            if month['file'] == filename:
+                days.update(month['days'])
+        if not days:
+            return 0
+
+        def read():
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(archive, columns=['day', 'line', 'message'])
+            for day, line, message in zip(table.column('day').to_pylist(), table.column('line').to_pylist(),
+                                          table.column('message').to_pylist()):
+                if day in days:
+                    yield day, line, json.loads(message)
+
+        return self._index_whole(archive, read)
+
+    # Indexar un Excel del formato anterior: un día sin log ni Parquet (si no,
+    # el Excel es la descarga materializada y sus mensajes ya están indexados)
+    def index_legacy_xlsx(self, xlsx_path):
+        folder_path = os.path.dirname(xlsx_path)
+        day = parse_day(os.path.basename(xlsx_path))
+        if day is None or os.path.exists(xlsx_path[:-len(EXCEL_EXT)] + LOG_EXT) or day in archived_days(folder_path):
+            return 0
+
+        def read():
+            columns, rows = read_xlsx(xlsx_path)
+            for line, values in enumerate(rows, 1):
+                yield day.isoformat(), line, {col: value for col, value in zip(columns, values) if value is not None}
+
+        return self._index_whole(xlsx_path, read)
+
+    # Un log (o un Excel del formato anterior) compactado: sus mensajes pasan a pertenecer al Parquet mensual.
+    # Si el día vuelve a recibir mensajes, el log nuevo se indexa desde el inicio.
+    def move_file(self, path, archive):
+        if not path.endswith((LOG_EXT, EXCEL_EXT)):
+            return
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('UPDATE chat_messages SET file = ? WHERE file = ?', (self._rel(archive), self._rel(path)))
+            conn.execute('DELETE FROM indexed_logs WHERE file = ?', (self._rel(path),))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    # Un archivo movido a otra ruta sin cambios (migración a carpetas repartidas)
+    def rename_file(self, path, new_path):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('UPDATE chat_messages SET file = ? WHERE file = ?', (self._rel(new_path), self._rel(path)))
+            conn.execute('UPDATE indexed_logs SET file = ? WHERE file = ?', (self._rel(new_path), self._rel(path)))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    # Quitar del índice un log, un Excel anterior o un Parquet mensual borrado (retención)
+    def remove_file(self, path):
+        if not path.endswith((LOG_EXT, EXCEL_EXT, ARCHIVE_EXT)):
+            return
+        rel = self._rel(path)
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM chat_messages WHERE file = ?', (rel,))
+            conn.execute('DELETE FROM indexed_logs WHERE file = ?', (rel,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    # Indexar lo pendiente de todo el historial (primer arranque, chats previos al
+    # índice): logs, meses compactados y días del formato anterior en Excel
+    def reindex(self):
+        start = time.time()
+        files = 0
+        messages = 0
+        for dirpath, _dirnames, filenames in os.walk(self.chats_folder):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.endswith(LOG_EXT):
+                    messages += self.index_log(path)
+                elif filename.endswith(ARCHIVE_EXT):
+                    messages += self.index_archive(path)
+                elif filename.endswith(EXCEL_EXT):
+                    messages += self.index_legacy_xlsx(path)
+                else:
+                    continue
+                files += 1
+        return {
+            'files': files,
+            'messages': messages,
+            'elapsed_seconds': round(time.time() - start, 3)
+        }
+
+    # Buscar; `phones` limita a una lista de teléfonos (por ejemplo, de una categoría)
+    def search(self, query, contact=None, phone=None, phones=None, date_from=None, date_to=None,
+               page=1, page_size=50):
+        expression = match_expression(query or '')
+        if not expression:
+            raise ChatSearchError('Parámetro q requerido')
+
+        page = max(int(page), 1)
+        page_size = min(max(int(page_size), 1), MAX_PAGE_SIZE)
+
+        sql = '''
+            SELECT m.folder, m.phone, m.day, m.line, m.sender, m.sent_at,
+                   snippet(chat_fts, 0, '[', ']', '…', 16), bm25(chat_fts)
+            FROM chat_fts
+            JOIN chat_messages m ON m.id = chat_fts.rowid
+            WHERE chat_fts MATCH ?
+        '''
+        params = [expression]
+
+        if contact:
+            sql += ' AND m.folder = ?'
+            params.append(contact)
+        if phone:
+            sql += ' AND m.phone = ?'
+            params.append(phone)
+        if phones is not None:
+            sql += ' AND m.phone IN (SELECT value FROM json_each(?))'
+            params.append(json.dumps(list(phones)))
+        if date_from:
+            sql += ' AND m.day >= ?'
+            params.append(date_from.isoformat())
+        if date_to:
+            sql += ' AND m.day <= ?'
+            params.append(date_to.isoformat())
+
+        # Una fila de más indica si hay otra página
+        sql += ' ORDER BY bm25(chat_fts) LIMIT ? OFFSET ?'
+        params.extend([page_size + 1, (page - 1) * page_size])
+
+        start = time.perf_counter()
+        rows = self._conn().execute(sql, params).fetchall()
+
+        return {
+            'hits': [
+                {
+                    'contact': folder,
+                    'phone': phone,
+                    'day': day,
+                    'line': line,
+                    'sender': sender,
+                    'sent_at': sent_at,
+                    'snippet': snippet,
+                    'score': round(-score, 4)
+                }
+                for folder, phone, day, line, sender, sent_at, snippet, score in rows[:page_size]
+            ],
+            'page': page,
+            'page_size': page_size,
+            'has_more': len(rows) > page_size,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
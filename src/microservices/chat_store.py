@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+from datetime import datetime
+from export_writer import write_xlsx, records_columns, records_to_rows, read_xlsx
+from chat_dedup import get_index, DEDUP_NAME
+from chat_locks import chat_lock
+
+# Historial de chats append-only.
+# Cada contacto tiene un JSONL por día ({nombre}_{telefono}_{dd-mm-YYYY}.jsonl):
+# agregar mensajes es un append al final del archivo, con costo constante por
+# lote. El .xlsx del día se materializa solo cuando alguien lo descarga.
+# Los días cerrados se compactan en un Parquet mensual por contacto
+# ({nombre}_{telefono}_{YYYY-MM}.parquet, ver chat_compaction); manifest.json
+# lista qué días contiene cada mes. Las lecturas combinan archivo y logs vivos.
+# Los mensajes ya guardados (reintentos de Node) se descartan al agregar, con
+# el índice dedup.idx de cada contacto (ver chat_dedup).
+# Toda escritura del historial de un contacto ocurre bajo su lock (chat_locks);
+# los archivos derivados (.xlsx, manifiesto) se escriben en un temporal único
+# y se publican con os.replace, así un lector nunca ve un archivo a medias.
+#
+# Las carpetas de contacto se reparten en dos niveles según el hash del
+# teléfono (CHATS_FOLDER/ab/cd/{nombre}_{telefono}): con ~100k contactos ningún
+# directorio pasa de unos cientos de entradas. Las carpetas planas anteriores
+# (CHATS_FOLDER/{nombre}_{telefono}) se siguen resolviendo hasta migrarlas con
+# migrate_chats.py.
+
+LOG_EXT = '.jsonl'
+EXCEL_EXT = '.xlsx'
+ARCHIVE_EXT = '.parquet'
+MANIFEST_NAME = 'manifest.json'
+# Archivos de control de la carpeta de un contacto (no son historial)
+METADATA_NAMES = (MANIFEST_NAME, DEDUP_NAME)
+
+# Niveles de subdirectorios y caracteres hexadecimales por nivel
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+
+# Nombre de la carpeta del contacto
+def contact_folder_name(contact_name, contact_phone):
+    return f"{contact_name.replace(' ', '_')}_{contact_phone}"
+
+
+# Subdirectorio (ab/cd) de las carpetas de un teléfono
+def phone_shard(contact_phone):
+    digest = hashlib.md5(str(contact_phone).encode('utf-8')).hexdigest()
+    return os.path.join(*(digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS)))
+
+
+# ¿Es un directorio de reparto y no una carpeta de contacto ({nombre}_{telefono})?
+def is_shard_name(name):
+    return len(name) == SHARD_WIDTH and all(c in '0123456789abcdef' for c in name)
+
+
+# Ruta en disco de la carpeta de un contacto: la repartida, o la plana
+# anterior si todavía no se migró; para carpetas nuevas, la repartida
+def contact_folder_path(chats_folder, folder_name):
+    sharded = os.path.join(chats_folder, phone_shard(folder_phone(folder_name)), folder_name)
+    if os.path.isdir(sharded):
+        return sharded
+    flat = os.path.join(chats_folder, folder_name)
+    if os.path.isdir(flat):
+        return flat
+    return sharded
+
+
+# Ruta en disco de "{carpeta}/{archivo}" (la forma de las URLs de descarga)
+def chat_file_path(chats_folder, filename):
+    folder_name, _, name = filename.replace(os.sep, '/').partition('/')
+    if not folder_name or not name:
+        return None
+    return os.path.join(contact_folder_path(chats_folder, folder_name), name)
+
+
+# Todas las carpetas de contacto: (nombre, ruta), repartidas y planas
+def iter_contact_folders(chats_folder, depth=0):
+    for entry in os.scandir(chats_folder):
+        if not entry.is_dir():
+            continue
+        if depth < SHARD_LEVELS and is_shard_name(entry.name):
+            yield from iter_contact_folders(entry.path, depth + 1)
+        elif depth in (0, SHARD_LEVELS):
+            yield entry.name, entry.path
+
+
+# Nombre base (sin extensión) del archivo de un día
+def day_basename(contact_name, contact_phone, day=None):
+    day = day or datetime.now().strftime("%d-%m-%Y")
+    return f"{contact_folder_name(contact_name, contact_phone)}_{day}"
+
+
+# Fecha (date) de un archivo diario a partir de su nombre; None si no aplica
+def parse_day(filename):
+    stem = os.path.splitext(filename)[0]
+    try:
+        return datetime.strptime(stem.rsplit('_', 1)[-1], "%d-%m-%Y").date()
+    except ValueError:
+        return None
+
+
+# Primer día del mes de un archivo mensual ({...}_YYYY-MM.parquet); None si no aplica
+def parse_month(filename):
+    stem = os.path.splitext(filename)[0]
+    try:
+        return datetime.strptime(stem.rsplit('_', 1)[-1], "%Y-%m").date()
+    except ValueError:
+        return None
+
+
+# Teléfono del contacto a partir del nombre de su carpeta
+def folder_phone(folder_name):
+    return folder_name.rsplit('_', 1)[-1]
+
+
+# Manifiesto de meses compactados de un contacto:
+# {'months': {'YYYY-MM': {'file': ..., 'days': {'YYYY-MM-DD': mensajes}, 'messages': n, 'bytes': n}}}
+def read_manifest(folder_path):
+    try:
+        with open(os.path.join(folder_path, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'months': {}}
+
+
+def write_manifest(folder_path, manifest):
+    fd, tmp_path = tempfile.mkstemp(dir=folder_path, prefix=MANIFEST_NAME + '.', suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(folder_path, MANIFEST_NAME))
+
+
+# Ruta del Parquet mensual que contiene `day`
+def archive_path(folder_path, day):
+    folder_name = os.path.basename(os.path.normpath(folder_path))
+    return os.path.join(folder_path, f"{folder_name}_{day.strftime('%Y-%m')}{ARCHIVE_EXT}")
+
+
+# Días compactados de un contacto: {fecha: ruta del Parquet} (solo meses cuyo archivo existe)
+def archived_days(folder_path, manifest=None):
+    manifest = manifest or read_manifest(folder_path)
+    days = {}
+    for month in manifest['months'].values():
+        path = os.path.join(folder_path, month['file'])
+        if not os.path.exists(path):
+            continue
+        for day in month['days']:
+            days[datetime.strptime(day, "%Y-%m-%d").date()] = path
+    return days
+
+
+# Mensajes de un día guardados en el Parquet mensual (un row group por día)
+def iter_archived_day(path, day):
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, columns=['message'], filters=[('day', '=', day.isoformat())])
+    for message in table.column('message').to_pylist():
+        yield json.loads(message)
+
+
+# Días guardados en la carpeta de un contacto: [(fecha, nombre base)] ordenados
+def list_days(folder_path, date_from=None, date_to=None):
+    days = {}
+    folder_name = os.path.basename(os.path.normpath(folder_path))
+    for day in archived_days(folder_path):
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        days[f"{folder_name}_{day.strftime('%d-%m-%Y')}"] = day
+    for entry in os.scandir(folder_path):
+        stem, ext = os.path.splitext(entry.name)
+        if ext not in (LOG_EXT, EXCEL_EXT) or not entry.is_file():
+            continue
+        day = parse_day(entry.name)
+        if day is None:
+            continue
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        days[stem] = day
+    return sorted((day, stem) for stem, day in days.items())
+
+
+# Leer los mensajes de un log JSONL; una última línea sin salto es un append
+# en curso y se ignora (la leerá la próxima lectura)
+def iter_log(log_path):
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+# Mensajes de un día: primero los compactados, luego los del log vivo
+def iter_day(folder_path, stem):
+    day = parse_day(stem)
+    archived = archived_days(folder_path).get(day) if day else None
+    if archived:
+        yield from iter_archived_day(archived, day)
+    log_path = os.path.join(folder_path, stem + LOG_EXT)
+    if os.path.exists(log_path):
+        yield from iter_log(log_path)
+
+
+# Agregar un lote de mensajes al final del log
+def _append_log(log_path, messages):
+    data = ''.join(json.dumps(msg, ensure_ascii=False, default=str) + '\n' for msg in messages).encode('utf-8')
+    with open(log_path, 'ab') as f:
+        f.write(data)
+    return len(data)
+
+
+# Pasar un .xlsx previo (formato anterior) al log, una sola vez
+def _migrate_legacy_xlsx(xlsx_path, log_path):
+    columns, rows = read_xlsx(xlsx_path)
+    _append_log(log_path, (
+        {col: value for col, value in zip(columns, row) if value is not None}
+        for row in rows
+    ))
+
+
+# Mensajes ya guardados de un contacto, para poblar su índice de deduplicación
+def iter_folder_messages(folder_path):
+    for _day, stem in list_days(folder_path):
+        yield from iter_day(folder_path, stem)
+
+
+# Guardar en el log del día los mensajes de un contacto que no estén ya guardados
+def append_chat(chats_folder, contact_name, contact_phone, messages, day=None):
+    folder_name = contact_folder_name(contact_name, contact_phone)
+    basename = day_basename(contact_name, contact_phone, day)
+
+    # La ruta se resuelve dentro del lock: la migración mueve la carpeta bajo el mismo lock
+    with chat_lock(folder_name):
+        folder_path = contact_folder_path(chats_folder, folder_name)
+        os.makedirs(folder_path, exist_ok=True)
+        log_path = os.path.join(folder_path, basename + LOG_EXT)
+        xlsx_path = os.path.join(folder_path, basename + EXCEL_EXT)
+
+        index = get_index(folder_path)
+        with index.locked(seed=lambda: iter_folder_messages(folder_path)):
+            # Un .xlsx sin log es del formato anterior, salvo que el día ya esté compactado
+            # (entonces es solo la descarga materializada)
+            if not os.path.exists(log_path) and os.path.exists(xlsx_path):
+                day_date = parse_day(basename)
+                if day_date not in archived_days(folder_path):
+                    _migrate_legacy_xlsx(xlsx_path, log_path)
+                    index.add(index.select(iter_log(log_path))[1])
+
+            fresh, digests = index.select(messages)
+            written = _append_log(log_path, fresh) if fresh else 0
+            # Después del append: si el proceso cae antes, el reintento vuelve a escribir
+            index.add(digests)
+
+    return {
+        'folder_name': folder_name,
+        'folder': folder_path,
+        'filename': basename + EXCEL_EXT,
+        'log_path': log_path,
+        'bytes': written,
+        'messages_saved': len(fresh),
+        'duplicates': len(messages) - len(fresh)
+    }
+
+
+# Generar (o reutilizar) el .xlsx de un día (log y/o Parquet mensual); devuelve la ruta del Excel
+def materialize_xlsx(xlsx_path):
+    folder_path = os.path.dirname(xlsx_path)
+    stem = os.path.splitext(os.path.basename(xlsx_path))[0]
+    log_path = os.path.join(folder_path, stem + LOG_EXT)
+
+    day = parse_day(stem)
+    archived = archived_days(folder_path).get(day) if day else None
+    sources = [path for path in (log_path, archived) if path and os.path.exists(path)]
+    if not sources:
+        return xlsx_path if os.path.exists(xlsx_path) else None
+
+    # El Excel sigue vigente si no es más viejo que el log y que el Parquet del mes
+    newest = max(os.stat(path).st_mtime_ns for path in sources)
+    if os.path.exists(xlsx_path) and os.stat(xlsx_path).st_mtime_ns >= newest:
+        return xlsx_path
+
+    # Dos pasadas sobre los mensajes: columnas y luego filas, sin cargarlos en memoria.
+    # Temporal único: dos descargas simultáneas del mismo día no se pisan
+    columns = records_columns(iter_day(folder_path, stem))
+    fd, tmp_path = tempfile.mkstemp(dir=folder_path, prefix=stem + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write_xlsx(tmp_path, columns, records_to_rows(iter_day(folder_path, stem), columns))
+        # mtime = el de las fuentes leídas: si hubo un append mientras tanto, la
+        # próxima descarga ve el log más nuevo y lo regenera
+        os.utime(tmp_path, ns=(newest, newest))
+        os.replace(tmp_path, xlsx_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return xlsx_path
+
+
+# Guardar los mensajes de un contacto midiendo el tiempo; corre dentro del pool
+# de /export/category-chats, por eso nunca lanza: devuelve el error en el resultado
+def export_contact_chat(chats_folder, contact_name, contact_phone, messages):
+    start = time.perf_counter()
+    result = {
+        'contact_name': contact_name,
+        'contact_phone': contact_phone
+    }
+    try:
+        saved = append_chat(chats_folder, contact_name, contact_phone, messages)
+        result.update({
+            'success': True,
+            'filename': saved['filename'],
+            'log_path': saved['log_path'],
+            'bytes': saved['bytes'],
+            'messages_saved': saved['messages_saved'],
+            'duplicates': saved['duplicates']
+        })
+    except Exception as e:
+        result.update({
+            'success': False,
+            'error': str(e)
+        })
+    result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return result
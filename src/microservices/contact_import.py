@@ -0,0 +1,235 @@
+import os
+import csv
+import io
+import zipfile
+
+# Importación de contactos por bloques.
+# El archivo (xlsx, csv o parquet) se lee CHUNK filas a la vez; cada
+# bloque se valida, normaliza y deduplica con operaciones vectorizadas de
+# pandas, así la memoria depende del tamaño del bloque y no del archivo.
+# pandas, openpyxl y pyarrow se importan en la primera importación, no al arrancar.
+
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 5000))
+
+# Mismos alias de columnas que acepta uploadRoutes.js
+COLUMN_ALIASES = {
+    'phone': 'telefono',
+    'name': 'nombre',
+    'category': 'categoria',
+    'message': 'mensaje'
+}
+
+IMPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+
+MIN_PHONE_LENGTH = 7
+MAX_PHONE_LENGTH = 20
+
+
+class ContactImportError(Exception):
+    pass
+
+
+# Nombres de columna normalizados. Un alias cuyo nombre canónico también está
+# en el archivo (phone junto a telefono) conserva su nombre y process_chunk lo
+# usa para las celdas vacías, como uploadRoutes.js; una columna repetida se ignora ('')
+def _normalize_header(header):
+    names = [str(col).strip().lower() if col is not None else '' for col in header]
+    columns = []
+    for name in names:
+        column = COLUMN_ALIASES.get(name, name)
+        if column != name and column in names:
+            column = name
+        if column in columns:
+            column = ''
+        columns.append(column)
+    return columns
+
+
+# Detectar el formato por los primeros bytes (xlsx es un zip, parquet empieza con PAR1)
+def detect_format(file, requested=None):
+    if requested:
+        if requested not in IMPORT_FORMATS:
+            raise ContactImportError(f'Formato no soportado: {requested}')
+        return requested
+
+    stream = getattr(file, 'stream', file)
+    head = stream.read(4)
+    stream.seek(0)
+
+    if head.startswith(b'PK'):
+        return 'xlsx'
+    if head == b'PAR1':
+        return 'parquet'
+    return 'csv'
+
+
+def _check_columns(columns):
+    if 'telefono' not in columns:
+        raise ContactImportError('Columna requerida "telefono" no encontrada')
+
+
+# Leer la hoja activa en DataFrames de chunk_size filas.
+# El encabezado se valida al abrir, antes de empezar a iterar.
+def read_xlsx_chunks(file, chunk_size=IMPORT_CHUNK_SIZE):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file, read_only=True, data_only=True)
+    rows = wb.active.iter_rows(values_only=True)
+    columns = _normalize_header(next(rows, None) or ())
+
+    try:
+        _check_columns(columns)
+    except ContactImportError:
+        wb.close()
+        raise
+
+    return _iter_chunks(wb, rows, columns, chunk_size)
+
+
+def _iter_chunks(wb, rows, columns, chunk_size):
+    import pandas as pd
+
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row[:len(columns)])
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        wb.close()
+
+
+# Leer un CSV con el lector incremental de pyarrow; todas las columnas como texto
+def read_csv_chunks(file, chunk_size=IMPORT_CHUNK_SIZE):
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    stream = getattr(file, 'stream', file)
+    header_line = stream.readline().decode('utf-8-sig')
+    stream.seek(0)
+
+    raw_columns = next(csv.reader(io.StringIO(header_line)), [])
+    columns = _normalize_header(raw_columns)
+    _check_columns(columns)
+
+    reader = pa_csv.open_csv(
+        stream,
+        read_options=pa_csv.ReadOptions(block_size=1 << 20),
+        convert_options=pa_csv.ConvertOptions(column_types={name: pa.string() for name in raw_columns})
+    )
+    return _iter_arrow_chunks(reader, columns, chunk_size)
+
+
+# Leer un Parquet por lotes de filas
+def read_parquet_chunks(file, chunk_size=IMPORT_CHUNK_SIZE):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(getattr(file, 'stream', file))
+    columns = _normalize_header(parquet_file.schema_arrow.names)
+    _check_columns(columns)
+    return _iter_arrow_chunks(parquet_file.iter_batches(batch_size=chunk_size), columns, chunk_size)
+
+
+def _iter_arrow_chunks(batches, columns, chunk_size):
+    for batch in batches:
+        df = batch.to_pandas()
+        df.columns = columns
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size].copy()
+
+
+# Errores de lectura de un archivo mal formado (fila irregular, zip o Parquet
+# dañado, texto que no es UTF-8): son errores del archivo, no del servidor
+def _read_errors():
+    import pyarrow as pa
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    return (ValueError, zipfile.BadZipFile, pa.ArrowException, InvalidFileException)
+
+
+# Los bloques se leen mientras se responde: un error a mitad del archivo
+# también sale como ContactImportError
+def _checked_chunks(chunks):
+    try:
+        yield from chunks
+    except ContactImportError:
+        raise
+    except _read_errors() as e:
+        raise ContactImportError(f'Archivo inválido: {e}') from e
+
+
+# Lector por bloques según el formato
+def read_chunks(file, fmt, chunk_size=IMPORT_CHUNK_SIZE):
+    readers = {'xlsx': read_xlsx_chunks, 'csv': read_csv_chunks, 'parquet': read_parquet_chunks}
+    try:
+        chunks = readers[fmt](file, chunk_size)
+    except ContactImportError:
+        raise
+    except _read_errors() as e:
+        raise ContactImportError(f'Archivo inválido: {e}') from e
+    return _checked_chunks(chunks)
+
+
+# Leer el archivo completo (respuesta clásica sin bloques)
+def read_dataframe(file, fmt):
+    import pandas as pd
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    if fmt == 'xlsx':
+        return pd.read_excel(file, engine='openpyxl')
+    if fmt == 'parquet':
+        return pq.read_table(getattr(file, 'stream', file)).to_pandas()
+    return pa_csv.read_csv(getattr(file, 'stream', file)).to_pandas()
+
+
+# Dejar solo dígitos; los números leídos como float pierden el ".0"
+def normalize_phones(series):
+    return (
+        series.astype(str)
+        .str.strip()
+        .str.replace(r'\.0+$', '', regex=True)
+        .str.replace(r'\D', '', regex=True)
+    )
+
+
+# Validar, normalizar y deduplicar un bloque; `seen` acumula los teléfonos ya vistos
+def process_chunk(df, seen):
+    import pandas as pd
+
+    df = df.loc[:, [col for col in df.columns if col]]
+    for alias, column in COLUMN_ALIASES.items():
+        if alias in df.columns and column in df.columns:
+            empty = df[column].isna() | (df[column].astype(str).str.strip() == '')
+            df[column] = df[column].where(~empty, df[alias])
+            df = df.drop(columns=alias)
+    df['telefono'] = normalize_phones(df['telefono'])
+
+    lengths = df['telefono'].str.len()
+    valid = df[(lengths >= MIN_PHONE_LENGTH) & (lengths <= MAX_PHONE_LENGTH)]
+
+    duplicated = valid['telefono'].duplicated() | valid['telefono'].isin(seen)
+    unique = valid[~duplicated]
+    seen.update(unique['telefono'])
+
+    # NaN no es JSON válido
+    unique = unique.astype(object).where(pd.notna(unique), None)
+
+    return {
+        'contacts': unique.to_dict('records'),
+        'rows': len(df),
+        'invalid': len(df) - len(valid),
+        'duplicates': int(duplicated.sum())
+    }
+
+
+# Procesar los bloques en orden, deduplicando entre bloques
+def iter_import(chunks):
+    seen = set()
+    for index, df in enumerate(chunks):
+        result = process_chunk(df, seen)
+        result['chunk'] = index
+        yield result
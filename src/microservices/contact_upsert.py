@@ -0,0 +1,105 @@
+import os
+
+# Alta/actualización masiva de contactos directamente en MySQL.
+# Por cada lote: un SELECT ... WHERE usuario_id = %s AND telefono IN (...)
+# (resuelto con idx_telefono) para saber qué teléfonos ya existen, luego un
+# executemany de INSERT para los nuevos y otro de UPDATE para los que cambian.
+
+UPSERT_BATCH_SIZE = int(os.getenv('UPSERT_BATCH_SIZE', 1000))
+
+
+# Mapa nombre de categoría (minúsculas) -> id para el usuario
+def _load_categories(cursor, usuario_id):
+    cursor.execute('SELECT id, nombre FROM categorias WHERE usuario_id = %s', [usuario_id])
+    return {str(nombre).strip().lower(): cat_id for cat_id, nombre in cursor.fetchall()}
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _upsert_batch(cursor, usuario_id, batch, categories, categoria_id):
+    phones = [contact['telefono'] for contact in batch]
+    placeholders = ', '.join(['%s'] * len(phones))
+    cursor.execute(
+        f'''SELECT id, telefono, nombre, categoria_id
+            FROM contactos
+            WHERE usuario_id = %s AND telefono IN ({placeholders})''',
+        [usuario_id] + phones
+    )
+
+    existing = {}
+    for contact_id, telefono, nombre, cat_id in cursor.fetchall():
+        existing.setdefault(telefono, (contact_id, nombre, cat_id))
+
+    inserts = []
+    updates = []
+    skipped = 0
+
+    for contact in batch:
+        nombre = _text(contact.get('nombre'))
+        categoria = _text(contact.get('categoria'))
+        cat_id = categories.get(categoria.lower(), categoria_id) if categoria else categoria_id
+
+        if contact['telefono'] not in existing:
+            inserts.append((usuario_id, cat_id, nombre, contact['telefono'], 'pendiente'))
+            continue
+
+        contact_id, old_nombre, old_cat_id = existing[contact['telefono']]
+        new_nombre = nombre or old_nombre
+        new_cat_id = cat_id or old_cat_id
+        if (new_nombre, new_cat_id) == (old_nombre, old_cat_id):
+            skipped += 1
+        else:
+            updates.append((new_nombre, new_cat_id, contact_id))
+
+    if inserts:
+        cursor.executemany(
+            'INSERT INTO contactos (usuario_id, categoria_id, nombre, telefono, estado) VALUES (%s, %s, %s, %s, %s)',
+            inserts
+        )
+    if updates:
+        cursor.executemany(
+            'UPDATE contactos SET nombre = %s, categoria_id = %s WHERE id = %s',
+            updates
+        )
+
+    return len(inserts), len(updates), skipped
+
+
+# Escribir en `contactos` los resultados de contact_import.iter_import
+def upsert_contacts(conn, usuario_id, results, categoria_id=None, progress=None):
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0, 'invalid': 0, 'duplicates': 0}
+    cursor = conn.cursor()
+
+    try:
+        categories = _load_categories(cursor, usuario_id)
+
+        for result in results:
+            # Filas inválidas o repetidas dentro del archivo no llegan a MySQL
+            counts['invalid'] += result['invalid']
+            counts['duplicates'] += result['duplicates']
+            counts['skipped'] += result['invalid'] + result['duplicates']
+
+            contacts = result['contacts']
+            for start in range(0, len(contacts), UPSERT_BATCH_SIZE):
+                batch = contacts[start:start + UPSERT_BATCH_SIZE]
+                inserted, updated, skipped = _upsert_batch(cursor, usuario_id, batch, categories, categoria_id)
+                conn.commit()
+
+                counts['inserted'] += inserted
+                counts['updated'] += updated
+                counts['skipped'] += skipped
+
+            if progress:
+                progress(counts['inserted'] + counts['updated'] + counts['skipped'])
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    return counts
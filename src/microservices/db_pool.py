@@ -0,0 +1,109 @@
+import time
+import threading
+
+# Pool de conexiones MySQL del microservicio.
+# mysql.connector.pooling falla de inmediato si no hay conexiones libres; aquí
+# se espera hasta DB_POOL_TIMEOUT antes de fallar y se llevan métricas de espera
+# y uso. El pool ya verifica (y reabre) cada conexión al prestarla.
+# mysql.connector se importa junto con el pool, al primer uso.
+
+
+# Conexión prestada: close() la devuelve al pool y descuenta el uso una sola vez
+class _Checkout:
+    def __init__(self, conn, on_close):
+        self._conn = conn
+        self._on_close = on_close
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        on_close, self._on_close = self._on_close, None
+        if on_close is None:
+            return
+        try:
+            self._conn.close()
+        finally:
+            on_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DBPool:
+    def __init__(self, name, size, timeout, **connect_args):
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+        self.connect_args = connect_args
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # El pool se crea al primer uso (crear conexiones requiere MySQL arriba)
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    from mysql.connector import pooling
+                    self._pool = pooling.MySQLConnectionPool(
+                        pool_name=self.name,
+                        pool_size=self.size,
+                        **self.connect_args
+                    )
+        return self._pool
+
+    # Sacar una conexión; conn.close() la devuelve al pool
+    def get_connection(self):
+        from mysql.connector.errors import PoolError
+
+        pool = self._get_pool()
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        while True:
+            try:
+                conn = pool.get_connection()
+                break
+            except PoolError:
+                if time.monotonic() >= deadline:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise
+                time.sleep(0.05)
+
+        waited = time.monotonic() - start
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        return _Checkout(conn, self._release)
+
+    def _release(self):
+        with self._lock:
+            self._in_use -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pool_name': self.name,
+                'pool_size': self.size,
+                'in_use': self._in_use,
+                'idle': self.size - self._in_use,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'wait_seconds_total': round(self._wait_total, 6),
+                'wait_seconds_max': round(self._wait_max, 6),
+                'wait_seconds_avg': round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0
+            }
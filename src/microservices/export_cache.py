@@ -0,0 +1,72 @@
+import json
+import uuid
+import hashlib
+from datetime import datetime
+
+# Caché de resultados de /export/contacts.
+# La versión de los datos es (MAX(fecha_actualizado), COUNT(*)) de los contactos
+# exportados: si no cambió desde la última exportación con el mismo usuario,
+# categoría y formato, se devuelve el archivo ya generado.
+# El nombre del archivo lleva un hash de la clave: dos usuarios que exportan en
+# el mismo segundo no comparten archivo y una entrada solo reutiliza el suyo.
+
+CACHE_KEY = 'export:cache:contacts:{}:{}:{}'
+
+
+def cache_key(usuario_id, categoria_id, fmt):
+    return CACHE_KEY.format(usuario_id, categoria_id or 'all', fmt)
+
+
+def key_tag(key):
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=6).hexdigest()
+
+
+# El archivo fue generado para esta clave
+def owns(key, filename):
+    return f'_{key_tag(key)}_' in filename
+
+
+# Nombre único de una exportación: fecha, hash de la clave y un sufijo aleatorio
+# (dos exportaciones simultáneas de la misma clave tampoco se pisan)
+def export_filename(prefix, key, fmt):
+    return f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}_{key_tag(key)}_{uuid.uuid4().hex[:8]}.{fmt}'
+
+
+# Versión actual de los datos (consulta sobre idx_usuario / idx_categoria)
+def contacts_version(conn, usuario_id, categoria_id=None):
+    query = 'SELECT COUNT(*), MAX(fecha_actualizado) FROM contactos WHERE usuario_id = %s'
+    params = [usuario_id]
+    if categoria_id:
+        query += ' AND categoria_id = %s'
+        params.append(categoria_id)
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        count, last_update = cursor.fetchone()
+    finally:
+        cursor.close()
+    return f'{last_update}|{count}'
+
+
+# Entrada en caché para esa versión, o None (también si el archivo no es de esta clave)
+def get_cached(redis_client, key, version):
+    entry = redis_client.get(key)
+    if not entry:
+        return None
+    entry = json.loads(entry)
+    if entry['version'] != version or not owns(key, entry['filename']):
+        return None
+    return entry
+
+
+# Guardar la nueva exportación; devuelve la entrada que reemplaza si su archivo
+# es de esta clave (para borrarlo), o None
+def store(redis_client, key, version, filename, total):
+    previous = redis_client.getset(key, json.dumps({
+        'version': version,
+        'filename': filename,
+        'total': total
+    }))
+    previous = json.loads(previous) if previous else None
+    return previous if previous and owns(key, previous['filename']) else None
@@ -0,0 +1,33 @@
+# Exportación incremental de contactos.
+# Cada exportación delta cubre el intervalo [since, hasta) sobre
+# fecha_actualizado, donde `hasta` es NOW() de MySQL al momento de consultar;
+# el nuevo watermark es ese `hasta`. Las filas modificadas en el mismo segundo
+# de la consulta quedan para la siguiente ejecución, así no se pierden ni se
+# repiten filas entre ejecuciones consecutivas.
+
+WATERMARK_KEY = 'export:watermark:{}:{}:{}'
+WATERMARK_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def watermark_key(consumer, usuario_id, categoria_id):
+    return WATERMARK_KEY.format(consumer, usuario_id, categoria_id or 'all')
+
+
+# Watermark guardado para un consumidor (None si es su primera sincronización)
+def get_watermark(redis_client, consumer, usuario_id, categoria_id):
+    return redis_client.get(watermark_key(consumer, usuario_id, categoria_id))
+
+
+def set_watermark(redis_client, consumer, usuario_id, categoria_id, watermark):
+    redis_client.set(watermark_key(consumer, usuario_id, categoria_id), watermark)
+
+
+# Hora actual de MySQL, truncada al segundo como fecha_actualizado
+def db_now(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT NOW()')
+        now = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    return now.strftime(WATERMARK_FORMAT) if hasattr(now, 'strftime') else str(now)
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+from datetime import datetime
+
+# Cola de trabajos de exportación en Redis.
+# La API encola el trabajo (LPUSH) y responde con su id; worker.py lo toma
+# con BLMOVE hacia su lista de procesamiento, ejecuta el handler y deja
+# progreso y resultado en un hash. El id sale de esa lista al terminar.
+# Cada worker publica un heartbeat; si uno muere a mitad de un trabajo (OOM,
+# SIGKILL), otro worker (o él mismo al reiniciar) devuelve sus trabajos a la
+# cola, y un trabajo que ya agotó sus intentos queda como fallido.
+
+JOB_QUEUE = 'export:jobs:queue'
+JOB_KEY = 'export:job:{}'
+PROCESSING_KEY = 'export:jobs:processing:{}'
+WORKERS_KEY = 'export:jobs:workers'
+# Segundos que se conserva el estado de un trabajo terminado
+JOB_TTL = int(os.getenv('EXPORT_JOB_TTL', 86400))
+# Ejecuciones de un trabajo antes de darlo por fallido (un OOM se repetiría)
+JOB_MAX_ATTEMPTS = int(os.getenv('EXPORT_JOB_MAX_ATTEMPTS', 2))
+# Segundos sin heartbeat tras los que un worker se da por muerto
+WORKER_STALE_AFTER = float(os.getenv('WORKER_STALE_AFTER', 60))
+
+
+def _job_key(job_id):
+    return JOB_KEY.format(job_id)
+
+
+def _update(redis_client, job_id, **fields):
+    fields['updated_at'] = datetime.now().isoformat()
+    redis_client.hset(_job_key(job_id), mapping=fields)
+
+
+# Encolar un trabajo y devolver su id
+def enqueue_job(redis_client, job_type, payload):
+    job_id = uuid.uuid4().hex
+    key = _job_key(job_id)
+    now = datetime.now().isoformat()
+
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping={
+        'id': job_id,
+        'type': job_type,
+        'status': 'queued',
+        'payload': json.dumps(payload),
+        'done': 0,
+        'total': 0,
+        'created_at': now,
+        'updated_at': now
+    })
+    pipe.expire(key, JOB_TTL)
+    pipe.lpush(JOB_QUEUE, job_id)
+    pipe.execute()
+    return job_id
+
+
+# Estado público de un trabajo (sin el payload); None si no existe
+def get_job(redis_client, job_id):
+    job = redis_client.hgetall(_job_key(job_id))
+    if not job:
+        return None
+
+    job.pop('payload', None)
+    job['done'] = int(job.get('done', 0))
+    job['total'] = int(job.get('total', 0))
+    job['attempts'] = int(job.get('attempts', 0))
+    if 'result' in job:
+        job['result'] = json.loads(job['result'])
+    return job
+
+
+# Ejecutar un trabajo encolado con el handler de su tipo
+def run_job(redis_client, handlers, job_id):
+    job = redis_client.hgetall(_job_key(job_id))
+    if not job:
+        # Expiró antes de que un worker lo tomara
+        return
+
+    handler = handlers.get(job['type'])
+    if handler is None:
+        _update(redis_client, job_id, status='failed', error=f"Tipo de exportación desconocido: {job['type']}")
+        return
+
+    # Los intentos anteriores terminaron con el worker (recover_jobs lo devolvió a la cola)
+    attempts = redis_client.hincrby(_job_key(job_id), 'attempts', 1)
+    if attempts > JOB_MAX_ATTEMPTS:
+        _update(
+            redis_client, job_id,
+            status='failed',
+            error=f'El worker terminó durante el trabajo ({attempts - 1} intentos)',
+            finished_at=datetime.now().isoformat()
+        )
+        return
+
+    _update(redis_client, job_id, status='running', started_at=datetime.now().isoformat())
+
+    def progress(done, total=None):
+        fields = {'done': done}
+        if total is not None:
+            fields['total'] = total
+        _update(redis_client, job_id, **fields)
+
+    try:
+        result = handler(json.loads(job['payload']), progress=progress)
+        _update(
+            redis_client, job_id,
+            status='done',
+            result=json.dumps(result, default=str),
+            finished_at=datetime.now().isoformat()
+        )
+    except Exception as e:
+        _update(
+            redis_client, job_id,
+            status='failed',
+            error=str(e),
+            finished_at=datetime.now().isoformat()
+        )
+
+
+def _processing_key(worker_id):
+    return PROCESSING_KEY.format(worker_id)
+
+
+def default_worker_id():
+    return os.getenv('WORKER_ID') or f'{socket.gethostname()}:{os.getpid()}'
+
+
+# Devolver a la cola los trabajos de workers sin heartbeat reciente y los que
+# quedaron en la lista propia (reinicio con el mismo WORKER_ID). LMOVE es
+# atómico: si dos workers recuperan a la vez, cada trabajo vuelve una sola vez
+def recover_jobs(redis_client, worker_id, stale_after=WORKER_STALE_AFTER):
+    stale = redis_client.zrangebyscore(WORKERS_KEY, '-inf', time.time() - stale_after)
+    recovered = 0
+    for dead in set(stale) | {worker_id}:
+        processing = _processing_key(dead)
+        while True:
+            job_id = redis_client.lmove(processing, JOB_QUEUE, 'RIGHT', 'RIGHT')
+            if job_id is None:
+                break
+            if redis_client.exists(_job_key(job_id)):
+                _update(redis_client, job_id, status='queued')
+            recovered += 1
+        if dead != worker_id:
+            redis_client.zrem(WORKERS_KEY, dead)
+    if recovered:
+        print('♻️ Trabajos devueltos a la cola:', recovered)
+    return recovered
+
+
+def _heartbeat(redis_client, worker_id, interval, stop):
+    while not stop.wait(interval):
+        try:
+            redis_client.zadd(WORKERS_KEY, {worker_id: time.time()})
+        except Exception as e:
+            print('⚠️ Heartbeat del worker:', e)
+
+
+# Bucle del worker: bloquea en la cola y procesa un trabajo a la vez.
+# Sale cuando should_stop() es verdadero (nunca a mitad de un trabajo) o tras max_jobs trabajos.
+def run_worker(redis_client, handlers, timeout=5, should_stop=None, max_jobs=0,
+               worker_id=None, stale_after=WORKER_STALE_AFTER):
+    worker_id = worker_id or default_worker_id()
+    processing = _processing_key(worker_id)
+
+    recover_jobs(redis_client, worker_id, stale_after)
+    redis_client.zadd(WORKERS_KEY, {worker_id: time.time()})
+    stop = threading.Event()
+    threading.Thread(
+        target=_heartbeat,
+        args=(redis_client, worker_id, stale_after / 4, stop),
+        name='heartbeat',
+        daemon=True
+    ).start()
+
+    done = 0
+    next_recovery = time.monotonic() + stale_after
+    try:
+        while not (should_stop and should_stop()):
+            if max_jobs and done >= max_jobs:
+                break
+            if time.monotonic() >= next_recovery:
+                recover_jobs(redis_client, worker_id, stale_after)
+                next_recovery = time.monotonic() + stale_after
+            job_id = redis_client.blmove(JOB_QUEUE, processing, timeout, 'RIGHT', 'LEFT')
+            if job_id is None:
+                continue
+            run_job(redis_client, handlers, job_id)
+            redis_client.lrem(processing, 1, job_id)
+            done += 1
+    finally:
+        stop.set()
+        # Con un trabajo sin terminar (excepción) el heartbeat queda y vence:
+        # así otro worker lo devuelve a la cola
+        if not redis_client.llen(processing):
+            redis_client.zrem(WORKERS_KEY, worker_id)
+    return done
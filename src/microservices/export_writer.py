@@ -0,0 +1,150 @@
+import json
+from datetime import datetime, date
+from decimal import Decimal
+from itertools import islice
+
+# Escritor común de exportaciones (xlsx, csv, parquet).
+# Excel usa el modo write-only de openpyxl (streaming con lxml): cada fila se
+# serializa al disco en cuanto se agrega, sin construir el libro en memoria.
+# CSV y Parquet se escriben con pyarrow por lotes de filas.
+# openpyxl y pyarrow se importan al primer uso para no cargarlos al arrancar.
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+# Filas por lote al escribir con pyarrow
+ARROW_BATCH_SIZE = 10000
+
+
+# Convertir valores que openpyxl no sabe escribir
+def _cell(value):
+    if value is None or isinstance(value, (str, int, float, bool, datetime, date)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+# Escribir un iterador de filas (listas/tuplas) a un archivo .xlsx
+def write_xlsx(filepath, columns, rows):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(columns))
+
+    total = 0
+    for row in rows:
+        ws.append([_cell(value) for value in row])
+        total += 1
+
+    wb.save(filepath)
+    return total
+
+
+# Agrupar filas en RecordBatch de pyarrow; el esquema sale del primer lote
+def _iter_record_batches(columns, rows, batch_size=ARROW_BATCH_SIZE):
+    import pyarrow as pa
+
+    rows = iter(rows)
+    schema = None
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        arrays = [[_cell(value) for value in col] for col in zip(*batch)]
+
+        if schema is None:
+            inferred = [pa.array(values) for values in arrays]
+            # Columnas vacías en el primer lote: se guardan como texto
+            schema = pa.schema([
+                pa.field(name, pa.string() if arr.type == pa.null() else arr.type)
+                for name, arr in zip(columns, inferred)
+            ])
+
+        yield schema, pa.record_batch(
+            [pa.array(values, type=field.type) for values, field in zip(arrays, schema)],
+            schema=schema
+        )
+
+
+def _write_arrow(filepath, columns, rows, writer_class):
+    import pyarrow as pa
+
+    total = 0
+    writer = None
+    try:
+        for schema, batch in _iter_record_batches(columns, rows):
+            if writer is None:
+                writer = writer_class(filepath, schema)
+            writer.write_batch(batch)
+            total += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+    # Sin filas: archivo solo con el esquema (columnas como texto)
+    if writer is None:
+        schema = pa.schema([pa.field(name, pa.string()) for name in columns])
+        writer_class(filepath, schema).close()
+    return total
+
+
+# Escribir un iterador de filas a CSV con pyarrow
+def write_csv(filepath, columns, rows):
+    import pyarrow.csv as pa_csv
+
+    return _write_arrow(filepath, columns, rows, pa_csv.CSVWriter)
+
+
+# Escribir un iterador de filas a Parquet con pyarrow
+def write_parquet(filepath, columns, rows):
+    import pyarrow.parquet as pq
+
+    return _write_arrow(filepath, columns, rows, pq.ParquetWriter)
+
+
+# Escribir en el formato pedido (xlsx | csv | parquet)
+def write_rows(fmt, filepath, columns, rows):
+    writers = {'xlsx': write_xlsx, 'csv': write_csv, 'parquet': write_parquet}
+    return writers[fmt](filepath, columns, rows)
+
+
+# Columnas en orden de aparición (igual que pd.DataFrame / pd.concat)
+def records_columns(records, base_columns=()):
+    columns = list(base_columns)
+    seen = set(columns)
+    for record in records:
+        for key in record:
+            if key not in seen:
+                seen.add(key)
+                columns.append(key)
+    return columns
+
+
+# Convertir diccionarios a filas según el orden de columnas
+def records_to_rows(records, columns):
+    for record in records:
+        yield [record.get(col) for col in columns]
+
+
+# Leer un .xlsx existente en modo read-only: (columnas, iterador de filas)
+def read_xlsx(filepath):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(filepath, read_only=True)
+    rows = wb.active.iter_rows(values_only=True)
+    header = next(rows, None) or ()
+    columns = [col for col in header if col is not None]
+
+    def iter_rows():
+        try:
+            for row in rows:
+                yield list(row[:len(columns)])
+        finally:
+            wb.close()
+
+    return columns, iter_rows()
+
@@ -0,0 +1,251 @@
+import os
+import time
+import sqlite3
+import threading
+from chat_store import METADATA_NAMES
+from chat_compaction import COMPACTING_EXT
+
+# Índice persistente de archivos (downloads/ y chats/) en SQLite.
+# Las rutas de exportación registran cada archivo que escriben o borran; los
+# totales por área, carpeta y día se mantienen con triggers, así /stats/files
+# responde sin recorrer el disco. reconcile() sincroniza el índice con un
+# recorrido completo cuando hace falta (primer arranque, cambios externos).
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    area TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    day INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS area_totals (
+    area TEXT PRIMARY KEY,
+    files INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    folders INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS folder_totals (
+    area TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    PRIMARY KEY (area, folder)
+);
+CREATE INDEX IF NOT EXISTS idx_folder_bytes ON folder_totals (area, bytes);
+CREATE TABLE IF NOT EXISTS day_totals (
+    area TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    PRIMARY KEY (area, day)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO area_totals (area, files, bytes) VALUES (NEW.area, 1, NEW.size)
+        ON CONFLICT (area) DO UPDATE SET files = files + 1, bytes = bytes + NEW.size;
+    INSERT INTO folder_totals VALUES (NEW.area, NEW.folder, 1, NEW.size)
+        ON CONFLICT (area, folder) DO UPDATE SET files = files + 1, bytes = bytes + NEW.size;
+    INSERT INTO day_totals VALUES (NEW.area, NEW.day, 1, NEW.size)
+        ON CONFLICT (area, day) DO UPDATE SET files = files + 1, bytes = bytes + NEW.size;
+END;
+
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    UPDATE area_totals SET files = files - 1, bytes = bytes - OLD.size WHERE area = OLD.area;
+    UPDATE folder_totals SET files = files - 1, bytes = bytes - OLD.size
+        WHERE area = OLD.area AND folder = OLD.folder;
+    DELETE FROM folder_totals WHERE area = OLD.area AND folder = OLD.folder AND files <= 0;
+    UPDATE day_totals SET files = files - 1, bytes = bytes - OLD.size
+        WHERE area = OLD.area AND day = OLD.day;
+    DELETE FROM day_totals WHERE area = OLD.area AND day = OLD.day AND files <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE ON files BEGIN
+    UPDATE area_totals SET bytes = bytes - OLD.size + NEW.size WHERE area = NEW.area;
+    UPDATE folder_totals SET bytes = bytes - OLD.size + NEW.size
+        WHERE area = NEW.area AND folder = NEW.folder;
+    UPDATE day_totals SET files = files - 1, bytes = bytes - OLD.size
+        WHERE area = OLD.area AND day = OLD.day;
+    DELETE FROM day_totals WHERE area = OLD.area AND day = OLD.day AND files <= 0;
+    INSERT INTO day_totals VALUES (NEW.area, NEW.day, 1, NEW.size)
+        ON CONFLICT (area, day) DO UPDATE SET files = files + 1, bytes = bytes + NEW.size;
+END;
+
+CREATE TRIGGER IF NOT EXISTS folder_totals_ai AFTER INSERT ON folder_totals BEGIN
+    INSERT INTO area_totals (area, folders) VALUES (NEW.area, 1)
+        ON CONFLICT (area) DO UPDATE SET folders = folders + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS folder_totals_ad AFTER DELETE ON folder_totals BEGIN
+    UPDATE area_totals SET folders = folders - 1 WHERE area = OLD.area;
+END;
+'''
+
+# Límites (en días) de los tramos del histograma de antigüedad
+AGE_BUCKETS = [(0, 1), (1, 7), (7, 30), (30, 90), (90, None)]
+
+# Archivos internos que no se indexan: temporales, bases SQLite, metadatos de
+# las carpetas de chat (manifest.json, dedup.idx) y logs a mitad de compactar
+IGNORED_SUFFIXES = ('.tmp', '.sqlite', '.sqlite-wal', '.sqlite-shm', COMPACTING_EXT)
+IGNORED_NAMES = METADATA_NAMES
+
+
+def is_ignored(filename):
+    return filename.endswith(IGNORED_SUFFIXES) or filename in IGNORED_NAMES
+
+
+class FileIndex:
+    def __init__(self, db_path, root, areas):
+        # areas: {'downloads': ruta, 'chats': ruta}
+        self.db_path = db_path
+        self.root = os.path.abspath(root)
+        self.areas = {name: os.path.abspath(path) for name, path in areas.items()}
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    # Una conexión por hilo; WAL permite leer mientras otro proceso escribe
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(SCHEMA)
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    # (área, carpeta relativa dentro del área, ruta relativa a root) de un archivo
+    def _locate(self, path):
+        path = os.path.abspath(path)
+        for area, area_path in self.areas.items():
+            if path.startswith(area_path + os.sep):
+                folder = os.path.dirname(os.path.relpath(path, area_path))
+                return area, folder.replace(os.sep, '/'), os.path.relpath(path, self.root).replace(os.sep, '/')
+        return None
+
+    def _upsert(self, conn, located, size, mtime):
+        area, folder, rel = located
+        conn.execute(
+            '''INSERT INTO files (path, area, folder, size, mtime, day) VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, day = excluded.day''',
+            (rel, area, folder, size, mtime, int(mtime // 86400))
+        )
+
+    # Registrar (o actualizar) un archivo recién escrito
+    def record(self, path):
+        located = self._locate(path)
+        if located is None or is_ignored(os.path.basename(path)):
+            return
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return self.remove(path)
+        self._upsert(self._conn(), located, st.st_size, st.st_mtime)
+
+    # Quitar un archivo borrado
+    def remove(self, path):
+        located = self._locate(path)
+        if located is not None:
+            self._conn().execute('DELETE FROM files WHERE path = ?', (located[2],))
+
+    # Recorrer el disco y dejar el índice igual a lo que hay
+    def reconcile(self):
+        conn = self._conn()
+        start = time.time()
+        seen = 0
+
+        conn.execute('BEGIN')
+        try:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS seen_paths (path TEXT PRIMARY KEY)')
+            conn.execute('DELETE FROM seen_paths')
+
+            for area_path in self.areas.values():
+                for dirpath, _dirnames, filenames in os.walk(area_path):
+                    for filename in filenames:
+                        if is_ignored(filename):
+                            continue
+                        path = os.path.join(dirpath, filename)
+                        try:
+                            st = os.stat(path)
+                        except FileNotFoundError:
+                            continue
+                        located = self._locate(path)
+                        self._upsert(conn, located, st.st_size, st.st_mtime)
+                        conn.execute('INSERT OR IGNORE INTO seen_paths VALUES (?)', (located[2],))
+                        seen += 1
+
+            removed = conn.execute(
+                'DELETE FROM files WHERE path NOT IN (SELECT path FROM seen_paths)'
+            ).rowcount
+            conn.execute(
+                "INSERT INTO meta VALUES ('last_reconcile', ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (str(time.time()),)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        return {
+            'files': seen,
+            'removed': removed,
+            'elapsed_seconds': round(time.time() - start, 3)
+        }
+
+    def last_reconcile(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'last_reconcile'").fetchone()
+        return float(row[0]) if row else None
+
+    # Totales, carpetas más pesadas e histograma de antigüedad por área
+    def stats(self, top_folders=10):
+        conn = self._conn()
+        today = int(time.time() // 86400)
+        result = {}
+
+        for area in self.areas:
+            row = conn.execute(
+                'SELECT files, bytes, folders FROM area_totals WHERE area = ?', (area,)
+            ).fetchone() or (0, 0, 0)
+
+            largest = conn.execute(
+                '''SELECT folder, files, bytes FROM folder_totals
+                   WHERE area = ? ORDER BY bytes DESC LIMIT ?''',
+                (area, top_folders)
+            ).fetchall()
+
+            histogram = []
+            for low, high in AGE_BUCKETS:
+                # Días de antigüedad en [low, high): día del archivo en (today - high, today - low]
+                query = 'SELECT COALESCE(SUM(files), 0), COALESCE(SUM(bytes), 0) FROM day_totals WHERE area = ? AND day <= ?'
+                params = [area, today - low]
+                if high is not None:
+                    query += ' AND day > ?'
+                    params.append(today - high)
+                files, size = conn.execute(query, params).fetchone()
+                histogram.append({
+                    'label': f'{low}-{high}d' if high is not None else f'{low}d+',
+                    'files': files,
+                    'bytes': size
+                })
+
+            result[area] = {
+                'files': row[0],
+                'bytes': row[1],
+                'folders': row[2],
+                'largest_folders': [
+                    {'folder': folder, 'files': files, 'bytes': size}
+                    for folder, files, size in largest
+                ],
+                'age_histogram': histogram
+            }
+
+        return result
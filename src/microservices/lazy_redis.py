@@ -0,0 +1,23 @@
+import threading
+
+# Cliente Redis perezoso.
+# El módulo redis y el cliente se crean al primer comando, así importar app.py
+# (arranque, /health) no paga la importación ni toca la red.
+
+
+class LazyRedis:
+    def __init__(self, **connect_args):
+        self.connect_args = connect_args
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import redis
+                    self._client = redis.Redis(**self.connect_args)
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get_client(), name)
@@ -0,0 +1,147 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import request
+from prometheus_client import (
+    Counter, Histogram, Gauge, CollectorRegistry, REGISTRY,
+    generate_latest, CONTENT_TYPE_LATEST, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+
+# Métricas Prometheus del microservicio.
+# Con varios procesos (gunicorn, worker.py) definir PROMETHEUS_MULTIPROC_DIR
+# para que /metrics agregue los valores de todos.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REQUEST_LATENCY = Histogram(
+    'microservice_request_duration_seconds',
+    'Latencia de los requests por ruta',
+    ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+EXPORT_PHASE = Histogram(
+    'microservice_export_phase_duration_seconds',
+    'Duración de cada fase de una exportación',
+    ['export', 'phase'],
+    buckets=LATENCY_BUCKETS
+)
+EXPORT_ROWS = Counter(
+    'microservice_export_rows_total',
+    'Filas o mensajes escritos por las exportaciones',
+    ['export']
+)
+EXPORT_BYTES = Counter(
+    'microservice_export_bytes_total',
+    'Bytes escritos por las exportaciones',
+    ['export']
+)
+EXPORTS_IN_FLIGHT = Gauge(
+    'microservice_exports_in_flight',
+    'Exportaciones en curso',
+    ['export'],
+    multiprocess_mode='livesum'
+)
+
+
+# Medir una fase de una exportación
+@contextmanager
+def phase(export, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        EXPORT_PHASE.labels(export, name).observe(time.perf_counter() - start)
+
+
+# Decorador para los run_export_*: exportaciones en curso y duración total
+def track_export(export):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with EXPORTS_IN_FLIGHT.labels(export).track_inprogress(), phase(export, 'total'):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_phase(export, name, seconds):
+    EXPORT_PHASE.labels(export, name).observe(seconds)
+
+
+def count_written(export, rows, size):
+    EXPORT_ROWS.labels(export).inc(rows)
+    EXPORT_BYTES.labels(export).inc(size)
+
+
+# Métricas leídas al momento del scrape: pool MySQL y cola de trabajos
+class _StatsCollector:
+    def __init__(self, db_pool=None, queue_length=None):
+        self.db_pool = db_pool
+        self.queue_length = queue_length
+
+    # Nombres para el registro: sin describe() el registro llama a collect()
+    # al registrarse, lo que consultaría Redis al importar app.py
+    def describe(self):
+        if self.db_pool is not None:
+            for name in ('pool_size', 'in_use', 'idle'):
+                yield GaugeMetricFamily(f'microservice_db_{name}', '')
+            for name in ('checkouts', 'timeouts', 'pool_wait_seconds'):
+                yield CounterMetricFamily(f'microservice_db_{name}', '')
+        if self.queue_length is not None:
+            yield GaugeMetricFamily('microservice_export_jobs_queued', '')
+
+    def collect(self):
+        if self.db_pool is not None:
+            stats = self.db_pool.stats()
+            for name in ('pool_size', 'in_use', 'idle'):
+                yield GaugeMetricFamily(f'microservice_db_{name}', f'Pool MySQL: {name}', value=stats[name])
+            for name in ('checkouts', 'timeouts'):
+                yield CounterMetricFamily(f'microservice_db_{name}', f'Pool MySQL: {name}', value=stats[name])
+            yield CounterMetricFamily(
+                'microservice_db_pool_wait_seconds', 'Tiempo total esperando una conexión',
+                value=stats['wait_seconds_total']
+            )
+
+        if self.queue_length is not None:
+            try:
+                length = self.queue_length()
+            except Exception:
+                return
+            yield GaugeMetricFamily('microservice_export_jobs_queued', 'Trabajos en la cola de exportación', value=length)
+
+
+_stats_collector = None
+
+
+# Registrar los hooks de latencia por ruta y los colectores del proceso
+def init_app(app, db_pool=None, queue_length=None):
+    global _stats_collector
+    _stats_collector = _StatsCollector(db_pool, queue_length)
+    if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        REGISTRY.register(_stats_collector)
+
+    @app.before_request
+    def _start_timer():
+        request._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_latency(response):
+        start = getattr(request, '_metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(time.perf_counter() - start)
+        return response
+
+
+# Texto de exposición para /metrics
+def render():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        if _stats_collector is not None:
+            registry.register(_stats_collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,35 @@
+import argparse
+from app import CHATS_FOLDER, on_chat_file_moved
+from chat_migration import ChatFolderMigration
+
+# Migrar las carpetas de chats planas a la estructura repartida por hash del
+# teléfono, con la API en marcha. Se puede interrumpir y volver a ejecutar.
+# Uso (desde src/microservices):
+#   python migrate_chats.py --batch-size 500 --pause 0.5
+#   python migrate_chats.py --dry-run
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrar CHATS_FOLDER a carpetas repartidas')
+    parser.add_argument('--batch-size', type=int, default=500, help='carpetas por lote')
+    parser.add_argument('--max-batches', type=int, default=0, help='lotes por corrida (0 = hasta terminar)')
+    parser.add_argument('--pause', type=float, default=0.5, help='segundos de pausa entre lotes')
+    parser.add_argument('--dry-run', action='store_true', help='solo contar las carpetas pendientes')
+    args = parser.parse_args()
+
+    migration = ChatFolderMigration(CHATS_FOLDER, on_moved=on_chat_file_moved)
+    if args.dry_run:
+        print('📂 Carpetas planas pendientes:', len(migration.pending()))
+        return
+
+    report = migration.run(
+        batch_size=args.batch_size,
+        max_batches=args.max_batches,
+        pause=args.pause,
+        progress=lambda folders, files: print(f'🚚 {folders} carpetas, {files} archivos movidos')
+    )
+    print('✅ Migración:', report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import hmac
+import uuid
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime
+from flask import request
+
+# Perfilado bajo demanda de un request.
+# Un admin lo activa con el header X-Profile y el valor de PROFILE_TOKEN (sin
+# token configurado queda desactivado). Nunca en la query: el access log de
+# gunicorn la registra completa.
+# La ruta (incluido el cuerpo de las respuestas en streaming) corre bajo
+# cProfile y tracemalloc; el resultado se guarda en PROFILE_FOLDER como
+# <id>.prof (pstats) y <id>.json (resumen), y el id vuelve en el header X-Profile-Id.
+#
+# cProfile solo ve el hilo del request: el trabajo de los pools de exportación
+# aparece como espera. tracemalloc es global, por eso se perfila un request a la vez.
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+# Las rutas que consultan perfiles no se perfilan
+PROFILE_ROUTES = '/profiles/'
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 20
+
+
+class RequestProfiler:
+    def __init__(self, folder, token, keep=50, frames=10):
+        self.folder = folder
+        self.token = token
+        self.keep = keep
+        self.frames = frames
+        self._busy = threading.Lock()
+
+    # El token viene solo en el header; comparación en tiempo constante
+    def authorized(self):
+        if not self.token:
+            return False
+        supplied = request.headers.get(PROFILE_HEADER) or ''
+        return hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    def init_app(self, app):
+        @app.before_request
+        def _start_profile():
+            if request.path.startswith(PROFILE_ROUTES) or not self.authorized():
+                return
+            if not self._busy.acquire(blocking=False):
+                return
+            profile = cProfile.Profile()
+            tracemalloc.start(self.frames)
+            request._profile = (uuid.uuid4().hex, profile, time.perf_counter())
+            profile.enable()
+
+        @app.after_request
+        def _finish_profile(response):
+            running = getattr(request, '_profile', None)
+            if running is None:
+                if self.authorized() and not request.path.startswith(PROFILE_ROUTES):
+                    response.headers['X-Profile-Id'] = 'busy'
+                return response
+
+            request._profile = None
+            profile_id, profile, start = running
+            info = {
+                'method': request.method,
+                'path': request.path,
+                'route': request.url_rule.rule if request.url_rule else None,
+                'status': response.status_code
+            }
+            response.headers['X-Profile-Id'] = profile_id
+
+            # En respuestas en streaming el trabajo ocurre al enviar el cuerpo
+            if response.is_streamed:
+                response.call_on_close(lambda: self._finish(profile_id, profile, start, info))
+            else:
+                self._finish(profile_id, profile, start, info)
+            return response
+
+        # Una excepción no manejada salta after_request: liberar igual el perfilador
+        @app.teardown_request
+        def _abort_profile(_error):
+            running = getattr(request, '_profile', None)
+            if running is not None:
+                request._profile = None
+                profile_id, profile, start = running
+                self._finish(profile_id, profile, start, {
+                    'method': request.method,
+                    'path': request.path,
+                    'route': request.url_rule.rule if request.url_rule else None,
+                    'status': 500
+                })
+
+    def _finish(self, profile_id, profile, start, info):
+        profile.disable()
+        try:
+            elapsed = time.perf_counter() - start
+            _current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+            self._busy.release()
+        self.save(profile_id, profile, snapshot, peak, elapsed, info)
+
+    def _paths(self, profile_id):
+        base = os.path.join(self.folder, profile_id)
+        return base + '.prof', base + '.json'
+
+    # Guardar el perfil y un resumen con las funciones y asignaciones más pesadas
+    def save(self, profile_id, profile, snapshot, peak, elapsed, info):
+        os.makedirs(self.folder, exist_ok=True)
+        prof_path, summary_path = self._paths(profile_id)
+        profile.dump_stats(prof_path)
+
+        stats = pstats.Stats(profile).stats
+        functions = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        allocations = snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+
+        summary = {
+            'id': profile_id,
+            'created_at': datetime.now().isoformat(),
+            **info,
+            'elapsed_seconds': round(elapsed, 4),
+            'memory_peak_bytes': peak,
+            'functions': [
+                {
+                    'function': f'{filename}:{line}({name})',
+                    'calls': calls,
+                    'own_seconds': round(own, 6),
+                    'cumulative_seconds': round(cumulative, 6)
+                }
+                for (filename, line, name), (_prim, calls, own, cumulative, _callers) in functions
+            ],
+            'allocations': [
+                {
+                    'location': str(stat.traceback[0]),
+                    'bytes': stat.size,
+                    'blocks': stat.count
+                }
+                for stat in allocations
+            ]
+        }
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        self._prune()
+
+    # Conservar solo los `keep` perfiles más recientes
+    def _prune(self):
+        summaries = [
+            os.path.join(self.folder, name)
+            for name in os.listdir(self.folder) if name.endswith('.json')
+        ]
+        summaries.sort(key=os.path.getmtime, reverse=True)
+        for summary_path in summaries[self.keep:]:
+            for path in self._paths(os.path.basename(summary_path)[:-len('.json')]):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    # Resumen de un perfil (None si el id no existe)
+    def get(self, profile_id):
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        _prof_path, summary_path = self._paths(profile_id)
+        try:
+            with open(summary_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    # Ruta del archivo pstats de un perfil (None si no existe)
+    def stats_path(self, profile_id):
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        prof_path, _summary_path = self._paths(profile_id)
+        return prof_path if os.path.isfile(prof_path) else None
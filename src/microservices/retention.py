@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import calendar
+from datetime import datetime, time as dt_time
+from chat_store import parse_day, parse_month, METADATA_NAMES
+
+# Motor de retención de archivos en segundo plano.
+# Redis guarda índices ordenados por antigüedad, así cada barrido toma solo los
+# archivos vencidos (ZRANGEBYSCORE) en lotes acotados, sin recorrer carpetas:
+#   retention:downloads         ZSET ruta -> fecha de creación
+#   retention:downloads:access  ZSET ruta -> última descarga (LRU del presupuesto)
+#   retention:downloads:size    HASH ruta -> bytes
+#   retention:downloads:bytes   total de bytes en downloads/
+#   retention:chats             ZSET ruta -> fin del día (o del mes compactado) del archivo de chat
+
+KEY_DOWNLOADS = 'retention:downloads'
+KEY_ACCESS = 'retention:downloads:access'
+KEY_SIZES = 'retention:downloads:size'
+KEY_BYTES = 'retention:downloads:bytes'
+KEY_CHATS = 'retention:chats'
+KEY_CHAT_SIZES = 'retention:chats:size'
+KEY_SEEDED = 'retention:seeded'
+KEY_LAST_SWEEP = 'retention:last_sweep'
+KEY_LOCK = 'retention:lock'
+
+
+class RetentionManager:
+    def __init__(self, redis_client, root, downloads_folder, chats_folder,
+                 download_days=30, download_budget_bytes=0, chat_days=0,
+                 batch_size=500, max_batches=20, reconcile_interval=86400, on_remove=None):
+        self.redis = redis_client
+        self.root = os.path.abspath(root)
+        self.downloads_folder = os.path.abspath(downloads_folder)
+        self.chats_folder = os.path.abspath(chats_folder)
+        self.download_days = download_days
+        self.download_budget_bytes = download_budget_bytes
+        self.chat_days = chat_days
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.reconcile_interval = reconcile_interval
+        self.on_remove = on_remove
+
+    def _rel(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, '/')
+
+    def _abs(self, rel):
+        return os.path.join(self.root, rel)
+
+    # Registrar un archivo exportado en downloads/
+    def track_download(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        rel = self._rel(path)
+        previous = self.redis.hget(KEY_SIZES, rel)
+
+        pipe = self.redis.pipeline()
+        pipe.zadd(KEY_DOWNLOADS, {rel: st.st_mtime}, nx=True)
+        pipe.zadd(KEY_ACCESS, {rel: time.time()})
+        pipe.hset(KEY_SIZES, rel, st.st_size)
+        pipe.incrby(KEY_BYTES, st.st_size - int(previous or 0))
+        pipe.execute()
+
+    # Marcar una descarga (el presupuesto expulsa primero lo menos descargado)
+    def touch_download(self, path):
+        rel = self._rel(path)
+        self.redis.zadd(KEY_ACCESS, {rel: time.time()}, xx=True)
+
+    # Borrar una exportación ya reemplazada (caché de exportaciones)
+    def remove_download(self, path):
+        return self._drop_download(self._rel(path))
+
+    # Registrar un archivo de chat; vence según el día (o el mes) de su nombre
+    def track_chat(self, path):
+        filename = os.path.basename(path)
+        if filename in METADATA_NAMES:
+            return
+        day = parse_day(filename)
+        month = parse_month(filename) if day is None else None
+        if month is not None:
+            day = month.replace(day=calendar.monthrange(month.year, month.month)[1])
+        if day is not None:
+            score = datetime.combine(day, dt_time.max).timestamp()
+        else:
+            try:
+                score = os.path.getmtime(path)
+            except FileNotFoundError:
+                return
+        rel = self._rel(path)
+        pipe = self.redis.pipeline()
+        pipe.zadd(KEY_CHATS, {rel: score})
+        try:
+            pipe.hset(KEY_CHAT_SIZES, rel, os.path.getsize(path))
+        except FileNotFoundError:
+            pass
+        pipe.execute()
+
+    # Dejar de seguir un archivo de chat que otro proceso ya borró (compactación)
+    def forget_chat(self, path):
+        rel = self._rel(path)
+        pipe = self.redis.pipeline()
+        pipe.zrem(KEY_CHATS, rel)
+        pipe.hdel(KEY_CHAT_SIZES, rel)
+        pipe.execute()
+
+    # Registrar los archivos que faltan en los índices: los anteriores al índice y
+    # los que no se registraron porque Redis no respondía. Recorre todo el disco:
+    # solo lo llama el barrendero (run_forever), una vez cada reconcile_interval segundos
+    def seed(self):
+        if not self.redis.set(KEY_SEEDED, int(time.time()), nx=True, ex=max(int(self.reconcile_interval), 1)):
+            return
+        self._track_missing(self.downloads_folder, KEY_DOWNLOADS, self.track_download)
+        self._track_missing(self.chats_folder, KEY_CHATS, self.track_chat)
+
+    # Solo los no registrados: volver a registrar una descarga reiniciaría su último acceso
+    def _track_missing(self, folder, key, track):
+        for dirpath, _dirnames, filenames in os.walk(folder):
+            paths = [os.path.join(dirpath, filename) for filename in filenames if not filename.endswith('.tmp')]
+            if not paths:
+                continue
+            pipe = self.redis.pipeline()
+            for path in paths:
+                pipe.zscore(key, self._rel(path))
+            for path, score in zip(paths, pipe.execute()):
+                if score is None:
+                    track(path)
+
+    def _delete(self, rel):
+        path = self._abs(rel)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            size = 0
+        if self.on_remove:
+            self.on_remove(path)
+        return size
+
+    def _drop_download(self, rel):
+        size = self._delete(rel)
+        tracked = int(self.redis.hget(KEY_SIZES, rel) or 0)
+        pipe = self.redis.pipeline()
+        pipe.zrem(KEY_DOWNLOADS, rel)
+        pipe.zrem(KEY_ACCESS, rel)
+        pipe.hdel(KEY_SIZES, rel)
+        pipe.decrby(KEY_BYTES, tracked)
+        pipe.execute()
+        return size
+
+    def _drop_chat(self, rel):
+        size = self._delete(rel)
+        pipe = self.redis.pipeline()
+        pipe.zrem(KEY_CHATS, rel)
+        pipe.hdel(KEY_CHAT_SIZES, rel)
+        pipe.execute()
+        return size
+
+    # Borrar en lotes los miembros de `key` con puntaje <= cutoff
+    def _expire(self, key, cutoff, drop):
+        files = 0
+        reclaimed = 0
+        for _ in range(self.max_batches):
+            batch = self.redis.zrangebyscore(key, '-inf', cutoff, start=0, num=self.batch_size)
+            if not batch:
+                break
+            for rel in batch:
+                reclaimed += drop(rel)
+                files += 1
+        return files, reclaimed
+
+    # Expulsar exportaciones menos descargadas hasta entrar en el presupuesto
+    def _enforce_budget(self):
+        files = 0
+        reclaimed = 0
+        if not self.download_budget_bytes:
+            return files, reclaimed
+
+        for _ in range(self.max_batches):
+            total = int(self.redis.get(KEY_BYTES) or 0)
+            if total <= self.download_budget_bytes:
+                break
+            batch = self.redis.zrange(KEY_ACCESS, 0, self.batch_size - 1)
+            if not batch:
+                break
+            for rel in batch:
+                if total <= self.download_budget_bytes:
+                    break
+                tracked = int(self.redis.hget(KEY_SIZES, rel) or 0)
+                reclaimed += self._drop_download(rel)
+                total -= tracked
+                files += 1
+        return files, reclaimed
+
+    # Un barrido sobre los índices (sin recorrer carpetas); `download_days`
+    # permite forzar otra antigüedad
+    def sweep(self, download_days=None):
+        start = time.time()
+
+        download_days = self.download_days if download_days is None else download_days
+        expired, expired_bytes = self._expire(KEY_DOWNLOADS, start - download_days * 86400, self._drop_download)
+        evicted, evicted_bytes = self._enforce_budget()
+
+        chats_expired, chats_bytes = 0, 0
+        if self.chat_days:
+            chats_expired, chats_bytes = self._expire(KEY_CHATS, start - self.chat_days * 86400, self._drop_chat)
+
+        report = {
+            'finished_at': datetime.now().isoformat(),
+            'elapsed_seconds': round(time.time() - start, 3),
+            'downloads': {
+                'expired_files': expired,
+                'expired_bytes': expired_bytes,
+                'evicted_files': evicted,
+                'evicted_bytes': evicted_bytes,
+                'total_bytes': int(self.redis.get(KEY_BYTES) or 0),
+                'budget_bytes': self.download_budget_bytes
+            },
+            'chats': {
+                'expired_files': chats_expired,
+                'expired_bytes': chats_bytes
+            },
+            'reclaimed_bytes': expired_bytes + evicted_bytes + chats_bytes
+        }
+        self.redis.set(KEY_LAST_SWEEP, json.dumps(report))
+        return report
+
+    def last_sweep(self):
+        report = self.redis.get(KEY_LAST_SWEEP)
+        return json.loads(report) if report else None
+
+    # Bucle del barrendero; el lock en Redis evita barridos simultáneos entre pods
+    def run_forever(self, interval):
+        while True:
+            if self.redis.set(KEY_LOCK, os.getpid(), nx=True, ex=max(int(interval), 60)):
+                try:
+                    self.seed()
+                    report = self.sweep()
+                    print('🧹 Retención:', report['reclaimed_bytes'], 'bytes liberados')
+                except Exception as e:
+                    print('❌ Error en barrido de retención:', e)
+            time.sleep(interval)
@@ -0,0 +1,115 @@
+import os
+import random
+import shutil
+import threading
+from flask import request
+from gunicorn.app.base import BaseApplication
+
+# Servidor de producción del microservicio (gunicorn).
+# Uso (desde src/microservices): python serve.py
+#
+# Varios procesos con hilos (gthread) y la app precargada en el maestro: los
+# workers nacen con pandas/openpyxl/pyarrow ya importados. Cada worker se
+# recicla tras SERVER_RECYCLE_EXPORTS exportaciones pesadas para acotar el
+# crecimiento de memoria, y al reciclarse o recibir SIGTERM deja de aceptar
+# requests y espera hasta SERVER_GRACEFUL_TIMEOUT a que terminen las exportaciones en curso.
+
+SERVER_BIND = os.getenv('SERVER_BIND', f"0.0.0.0:{os.getenv('SERVER_PORT', 5000)}")
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', min(4, os.cpu_count() or 1)))
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', 4))
+# Segundos sin respuesta antes de matar un worker (las exportaciones grandes tardan)
+SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 300))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 120))
+# Exportaciones/importaciones por worker antes de reemplazarlo (0 desactiva)
+SERVER_RECYCLE_EXPORTS = int(os.getenv('SERVER_RECYCLE_EXPORTS', 200))
+
+# Rutas que cuentan para el reciclaje
+HEAVY_ENDPOINTS = {'export_contacts', 'export_category_chats', 'import_contacts', 'download_chats_zip'}
+
+# Con varios procesos las métricas se agregan desde archivos compartidos;
+# debe definirse antes de importar prometheus_client (vía app)
+if SERVER_WORKERS > 1 and not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.abspath('../../data/prometheus')
+os.environ.setdefault('PRELOAD_DEPENDENCIES', 'true')
+
+
+# Contar exportaciones pesadas del worker y pedir su reemplazo al llegar al límite
+class ExportRecycler:
+    def __init__(self, worker, limit):
+        self.worker = worker
+        self.limit = limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def after_request(self, response):
+        if request.endpoint in HEAVY_ENDPOINTS:
+            with self._lock:
+                self.count += 1
+                if self.count == self.limit:
+                    self.worker.log.info('Reciclando worker %s tras %s exportaciones', self.worker.pid, self.count)
+                    # Igual que max_requests: el worker termina lo que tiene en curso y sale
+                    self.worker.alive = False
+        return response
+
+
+def on_starting(server):
+    multiproc_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def post_fork(server, worker):
+    if SERVER_RECYCLE_EXPORTS > 0:
+        # Límite con jitter para que los workers no se reciclen todos a la vez
+        limit = SERVER_RECYCLE_EXPORTS + random.randint(0, SERVER_RECYCLE_EXPORTS // 10)
+        recycler = ExportRecycler(worker, limit)
+        worker.app.callable.after_request(recycler.after_request)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+class MicroserviceApplication(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        return app
+
+
+def main():
+    # El modo de desarrollo sigue disponible con: FLASK_DEBUG=true python app.py
+    from app import app, DOWNLOAD_FOLDER, CHATS_FOLDER
+    print('🐍 Microservicio Python iniciado')
+    print('📂 Carpeta de descargas:', DOWNLOAD_FOLDER)
+    print('💬 Carpeta de chats:', CHATS_FOLDER)
+    print(f'⚙️ {SERVER_WORKERS} workers x {SERVER_THREADS} hilos en {SERVER_BIND}')
+
+    MicroserviceApplication({
+        'bind': SERVER_BIND,
+        'workers': SERVER_WORKERS,
+        'threads': SERVER_THREADS,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': SERVER_TIMEOUT,
+        'graceful_timeout': SERVER_GRACEFUL_TIMEOUT,
+        'keepalive': 5,
+        'accesslog': '-',
+        'on_starting': on_starting,
+        'post_fork': post_fork,
+        'child_exit': child_exit
+    }).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import os
+import signal
+import threading
+from app import redis_client, retention, compactor, preload, EXPORT_HANDLERS
+from export_jobs import run_worker, JOB_QUEUE
+
+# Worker de exportaciones: procesa los trabajos que la API deja en Redis y,
+# en hilos aparte, ejecuta los barridos de retención y la compactación de chats.
+# Uso (desde src/microservices): python worker.py
+#
+# SIGTERM/SIGINT terminan el trabajo en curso antes de salir. Con WORKER_MAX_JOBS
+# el proceso sale tras esa cantidad de trabajos para que el supervisor lo reemplace.
+# Si el proceso muere a mitad de un trabajo, export_jobs.recover_jobs lo devuelve
+# a la cola (WORKER_ID fija el nombre de su lista de procesamiento).
+
+# Segundos entre barridos de retención (0 desactiva el barrendero)
+RETENTION_INTERVAL = int(os.getenv('RETENTION_INTERVAL', 3600))
+# Segundos entre compactaciones de chats (0 la desactiva)
+COMPACTION_INTERVAL = int(os.getenv('COMPACTION_INTERVAL', 86400))
+# Trabajos por proceso antes de salir (0 = sin límite)
+WORKER_MAX_JOBS = int(os.getenv('WORKER_MAX_JOBS', 0))
+
+stopping = threading.Event()
+
+
+def request_stop(signum, _frame):
+    print('🛑 Señal', signum, '- terminando el trabajo en curso')
+    stopping.set()
+
+if __name__ == '__main__':
+    print('🐍 Worker de exportaciones iniciado')
+    print('📥 Cola:', JOB_QUEUE)
+
+    # El worker siempre exporta: cargar las dependencias antes del primer trabajo
+    preload()
+
+    if RETENTION_INTERVAL > 0:
+        threading.Thread(
+            target=retention.run_forever,
+            args=(RETENTION_INTERVAL,),
+            name='retention',
+            daemon=True
+        ).start()
+        print('🧹 Retención cada', RETENTION_INTERVAL, 'segundos')
+
+    if COMPACTION_INTERVAL > 0:
+        threading.Thread(
+            target=compactor.run_forever,
+            args=(COMPACTION_INTERVAL,),
+            name='compaction',
+            daemon=True
+        ).start()
+        print('🗜️ Compactación de chats cada', COMPACTION_INTERVAL, 'segundos')
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    done = run_worker(redis_client, EXPORT_HANDLERS, should_stop=stopping.is_set, max_jobs=WORKER_MAX_JOBS)
+    print('👋 Worker detenido tras', done, 'trabajos')